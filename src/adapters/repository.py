@@ -129,18 +129,31 @@ class SqlAlchemyRepository:
         )
         return result
 
-    def get_announcement_basic_info(self):
+    def get_announcement_ad_ids(self):
         result = (
+            self.session.query(
+                Announcement.announcement_id,
+                Announcement.announcer
+            )
+            .all()
+        )
+        return result
+
+    def get_announcement_basic_info(self, min_id: int = None):
+        query = (
             self.session.query(
                 Announcement.id,
                 Announcement.title,
                 Announcement.vehicle_year,
                 Announcement.vehicle_km,
                 Announcement.price,
-                Announcement.announcer
+                Announcement.announcer,
+                Announcement.announcement_id
             )
-            .all()
         )
+        if min_id is not None:
+            query = query.filter(Announcement.id > min_id)
+        result = query.all()
         return result
 
     def get_announcement_id_by_basic_info(self,
@@ -166,8 +179,8 @@ class SqlAlchemyRepository:
         )
         return result
 
-    def get_vehicle_basic_info(self):
-        result = (
+    def get_vehicle_basic_info(self, min_id: int = None):
+        query = (
             self.session.query(
                 Vehicle.id,
                 Vehicle.make,
@@ -175,8 +188,10 @@ class SqlAlchemyRepository:
                 Vehicle.version,
                 Vehicle.year
             )
-            .all()
         )
+        if min_id is not None:
+            query = query.filter(Vehicle.id > min_id)
+        result = query.all()
         return result
 
     def get_vehicle_id_by_basic_info(self,
@@ -204,15 +219,17 @@ class SqlAlchemyRepository:
         )
         return result
 
-    def get_seller_basic_info(self):
-        result = (
+    def get_seller_basic_info(self, min_id: int = None):
+        query = (
             self.session.query(
                 Seller.id,
                 Seller.name,
                 Seller.province
             )
-            .all()
         )
+        if min_id is not None:
+            query = query.filter(Seller.id > min_id)
+        result = query.all()
         return result
 
     def get_seller_id_by_basic_info(self,
@@ -0,0 +1,176 @@
+"""
+bloom_filter.py module
+
+Compact Bloom filter of seen announcements keys (announcer, announcement ID). The filter is built from the ANNOUNCEMENT
+table, saved on a file and memory-mapped read-only, so all the scraper processes share the same few MB of memory instead
+of a complete cache copy each. Positive hits are checked against the database, so there are no false positives.
+"""
+
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+import tempfile
+
+from src.logger import Logger
+from src.utils import FileOperations
+from src.utils import DirectoryOperations
+from src.adapters.repository import SqlAlchemyRepository as Repository
+
+
+class BloomFilter:
+    _magic = b"BLOOM001"
+    _header_format = "<8sQQQ"
+    _header_size = struct.calcsize(_header_format)
+
+    def __init__(self,
+                 capacity: int = 1000000,
+                 error_rate: float = 0.001):
+        # Optimal number of bits and hashes for the capacity and the false positives rate:
+        capacity = max(1, capacity)
+        self.number_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.number_hashes = max(1, int(round(self.number_bits / capacity * math.log(2))))
+        self.number_items = 0
+        self._bits = bytearray((self.number_bits + 7) // 8)
+        self._mmap = None
+
+    def __len__(self) -> int:
+        return self.number_items
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits if self._mmap is None else self._mmap
+        offset = 0 if self._mmap is None else self._header_size
+        for position in self._get_positions(key):
+            if not bits[offset + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def _get_positions(self, key: str):
+        # Double hashing: k positions from two 64 bits hashes
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first_hash, second_hash = struct.unpack("<QQ", digest)
+        for index in range(self.number_hashes):
+            yield (first_hash + index * second_hash) % self.number_bits
+
+    def add(self, key: str) -> None:
+        if self._mmap is not None:
+            raise Exception("Bloom filter is read-only: it is loaded from a memory-mapped file")
+        for position in self._get_positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.number_items += 1
+
+    def save(self, file_path: str) -> None:
+        # Atomic write: processes reading the old file are not affected
+        DirectoryOperations.create_dir_by_file_path(file_path)
+        file_descriptor, temporary_file = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, 'wb') as bloom_file:
+                bloom_file.write(struct.pack(self._header_format,
+                                             self._magic,
+                                             self.number_bits,
+                                             self.number_hashes,
+                                             self.number_items))
+                bloom_file.write(self._bits)
+            os.replace(temporary_file, file_path)
+        except Exception:
+            os.remove(temporary_file)
+            raise
+
+    @classmethod
+    def load(cls, file_path: str):
+        FileOperations.check_file_exists(file_path)
+        bloom_filter = cls.__new__(cls)
+        with open(file_path, 'rb') as bloom_file:
+            bloom_filter._mmap = mmap.mmap(bloom_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, number_bits, number_hashes, number_items = struct.unpack(
+            cls._header_format, bloom_filter._mmap[:cls._header_size])
+        if magic != cls._magic:
+            raise Exception(f"File {file_path} is not a bloom filter file")
+        bloom_filter.number_bits = number_bits
+        bloom_filter.number_hashes = number_hashes
+        bloom_filter.number_items = number_items
+        bloom_filter._bits = None
+        return bloom_filter
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+
+
+class SeenAnnouncementsFilter:
+    def __init__(self,
+                 bloom_filter_file: str,
+                 error_rate: float = 0.001,
+                 repository_obj: Repository = None,
+                 logger_level="INFO"):
+        self._bloom_filter_file = bloom_filter_file
+        self._error_rate = error_rate
+        self._repository_obj = repository_obj
+        self._logger_level = logger_level
+        self._bloom_filter = None
+        self._number_false_positives = 0
+
+        # Set logger:
+        self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
+                              level=self._logger_level)
+
+    def _get_repository(self) -> Repository:
+        # Database is only opened for positive hits:
+        if self._repository_obj is None:
+            self._repository_obj = Repository()
+        return self._repository_obj
+
+    @staticmethod
+    def _get_key(announcer: str, announcement_id) -> str:
+        return f"{announcer}\x1f{announcement_id}"
+
+    def build(self) -> None:
+        announcements_ids = self._get_repository().get_announcement_ad_ids()
+        bloom_filter = BloomFilter(capacity=int(len(announcements_ids) * 1.2) + 1000, error_rate=self._error_rate)
+        for announcement_id, announcer in announcements_ids:
+            bloom_filter.add(self._get_key(announcer, announcement_id))
+        bloom_filter.save(self._bloom_filter_file)
+        self._logger.set_message(level="INFO",
+                                 message_level="MESSAGE",
+                                 message=f"Seen announcements filter built: {len(bloom_filter)} announcements, "
+                                         f"{os.path.getsize(self._bloom_filter_file)} bytes")
+
+    def load(self) -> None:
+        self._bloom_filter = BloomFilter.load(self._bloom_filter_file)
+
+    def is_announcement_known(self, announcer: str, announcement: dict) -> bool:
+        if self._bloom_filter is None:
+            self.load()
+
+        # Negative hits are exact: positive hits are checked in database
+        announcement_id = announcement.get("id")
+        if self._get_key(announcer, announcement_id) not in self._bloom_filter:
+            return False
+        if len(self._get_repository().get_announcement_id_by_ad_id(announcement_id, announcer)) > 0:
+            return True
+        self._number_false_positives += 1
+        return False
+
+    def get_new_announcements(self, announcer: str, announcements: list) -> list:
+        # Announcements summaries not seen, without duplicates and in the same order:
+        new_announcements = []
+        announcements_ids = set()
+        for announcement in announcements:
+            announcement_id = announcement.get("id")
+            if announcement_id in announcements_ids or self.is_announcement_known(announcer, announcement):
+                continue
+            announcements_ids.add(announcement_id)
+            new_announcements.append(announcement)
+        return new_announcements
+
+    def close(self) -> None:
+        if self._bloom_filter is not None:
+            self._bloom_filter.close()
+
+
+if __name__ == "__main__":
+    bloom_filter_obj = BloomFilter(capacity=1000)
+    bloom_filter_obj.add("coches.net\x1f1")
+    print("coches.net\x1f1" in bloom_filter_obj, "coches.net\x1f2" in bloom_filter_obj)
@@ -2,57 +2,450 @@
 cache.py module
 
 Extracts announcements, vehicles and sellers basic data, and it is used in database inserts to avoid duplicates. While
-using this module, performance is improved due to data is in memory, not in database.
+using this module, performance is improved due to data is in memory, not in database. Each entity is indexed in a hash
+table from its natural key to its database ID, so lookups and inserts are O(1) and they do not depend on cache size.
+Dataframes are only built on demand, for analytics. Compact mode keeps only 64 bits hashes of the natural keys and integer
+codes of the repeated strings, and hash collisions are checked in database. A versioned snapshot with the maximum ID of
+each table can be saved, so next start-ups only read from database the rows inserted after it. The same high-water marks
+are used to refresh the cache, on demand or in a background thread, with the rows inserted by other processes.
 """
 
 
+import glob
+import os
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 from src.logger import Logger
 from src.utils import FileOperations
+from src.utils import DirectoryOperations
+from src.utils import PickleFileOperations
+from src.utils import TIMEZONE_MADRID
 from src.adapters.repository import SqlAlchemyRepository as Repository
+from src.compact_index import HashIndex
+from src.compact_index import StringInterner
 
 
 class Cache:
+    # Natural keys of each entity:
+    ENTITY_KEY_COLUMNS = {
+        "announcements": ["title", "vehicle_year", "vehicle_km", "price", "announcer"],
+        "vehicles": ["make", "model", "version", "year"],
+        "sellers": ["name", "province"]
+    }
+    ANNOUNCEMENT_KEY_COLUMNS = ["title", "vehicle_year", "vehicle_km", "price"]
+
+    # Dataframes columns: database basic info
+    ENTITY_COLUMNS = {
+        "announcements": ["id", "title", "vehicle_year", "vehicle_km", "price", "announcer", "announcement_id"],
+        "vehicles": ["id", "make", "model", "version", "year"],
+        "sellers": ["id", "name", "province"]
+    }
+
+    # Compact mode dataframes columns: repeated strings as integer codes, and numbers as floats (NaN if empty)
+    INTERNED_COLUMNS = {
+        "announcements": ["announcer"],
+        "vehicles": ["make", "model", "version"],
+        "sellers": ["province"]
+    }
+    NUMERIC_COLUMNS = {
+        "announcements": ["vehicle_year", "vehicle_km", "price", "announcement_id"],
+        "vehicles": ["year"],
+        "sellers": []
+    }
+
+    # Snapshots of other versions or modes are not loaded:
+    SNAPSHOT_VERSION = 2
+    SNAPSHOT_FILE_NAME = "cache_snapshot.pkl"
+
     def __init__(self,
-                 logger_level="INFO"):
+                 logger_level="INFO",
+                 compact: bool = False,
+                 verify_hits: bool = False,
+                 snapshot_directory: str = None,
+                 refresh_interval: float = None):
         self._logger_level = logger_level
+        self._compact = compact
+        self._verify_hits = compact and verify_hits
+        self._snapshot_directory = snapshot_directory
+        self._refresh_interval = refresh_interval
 
         self._repository_obj = Repository()
 
-        self.announcements_cache = pd.DataFrame(columns=["id",
-                                                         "title",
-                                                         "vehicle_year",
-                                                         "vehicle_km",
-                                                         "price",
-                                                         "announcer"])
-        self.vehicles_cache = pd.DataFrame(columns=["id",
-                                                    "make",
-                                                    "model",
-                                                    "version",
-                                                    "year"])
-        self.sellers_cache = pd.DataFrame(columns=["id",
-                                                   "name",
-                                                   "province"])
-
-        # Set cache:
-        self.set_database_cache()
+        # Reads and inserts are locked: cache is shared by search, ingestion and refresh threads
+        self._lock = threading.RLock()
+        self._stop_event = threading.Event()
+        self._refresh_thread = None
 
         # Set logger:
         self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
                               level=self._logger_level)
 
+        # Entities indexes: natural key -> database ID, and rows for dataframes
+        # Announcements indexes: (announcer, announcement ID) and (title, vehicle year, vehicle km, price)
+        self._reset_cache()
+
+        # Set cache:
+        self.set_database_cache()
+        if self._refresh_interval is not None:
+            self.start_refresh()
+
+    @property
+    def announcements_cache(self) -> pd.DataFrame:
+        return self.get_dataframe("announcements")
+
+    @property
+    def vehicles_cache(self) -> pd.DataFrame:
+        return self.get_dataframe("vehicles")
+
+    @property
+    def sellers_cache(self) -> pd.DataFrame:
+        return self.get_dataframe("sellers")
+
+    def _reset_cache(self) -> None:
+        if self._compact:
+            self._indexes = {entity: HashIndex() for entity in self.ENTITY_KEY_COLUMNS}
+            self._announcements_ids = HashIndex()
+            self._announcements_keys = HashIndex()
+            self._interners = {column: StringInterner()
+                               for columns in self.INTERNED_COLUMNS.values() for column in columns}
+            self._rows = {entity: {"id": array('q'),
+                                   **{column: array('i') for column in columns},
+                                   **{column: array('d') for column in self.NUMERIC_COLUMNS[entity]}}
+                          for entity, columns in self.INTERNED_COLUMNS.items()}
+        else:
+            self._indexes = {entity: {} for entity in self.ENTITY_KEY_COLUMNS}
+            self._announcements_ids = set()
+            self._announcements_keys = set()
+            self._rows = {entity: [] for entity in self.ENTITY_KEY_COLUMNS}
+        self._dataframes = {entity: None for entity in self.ENTITY_KEY_COLUMNS}
+
+        # Database high-water marks: maximum ID of each table read from database
+        self._max_ids = {entity: None for entity in self.ENTITY_KEY_COLUMNS}
+
+    def _get_compact_dataframe(self, entity: str) -> pd.DataFrame:
+        # Free text columns (title, name) are not kept in compact mode:
+        rows = self._rows[entity]
+        data = {}
+        for column in self.ENTITY_COLUMNS[entity]:
+            if column == "id":
+                data[column] = np.array(rows[column], dtype=np.int64)
+            elif column in self.INTERNED_COLUMNS[entity]:
+                data[column] = pd.Categorical.from_codes(np.array(rows[column], dtype=np.int32),
+                                                         categories=self._interners[column].strings)
+            elif column in self.NUMERIC_COLUMNS[entity]:
+                data[column] = np.array(rows[column], dtype=np.float64)
+        return pd.DataFrame(data)
+
+    def get_dataframe(self, entity: str) -> pd.DataFrame:
+        # Dataframes are built again only after inserts: reads and inserts of other threads are locked
+        with self._lock:
+            dataframe = self._dataframes[entity]
+            if dataframe is None:
+                if self._compact:
+                    dataframe = self._get_compact_dataframe(entity)
+                else:
+                    dataframe = pd.DataFrame(self._rows[entity], columns=self.ENTITY_COLUMNS[entity])
+                self._dataframes[entity] = dataframe
+            return dataframe
+
+    def _get_compact_indexes(self) -> dict:
+        return {**self._indexes,
+                "announcements_ids": self._announcements_ids,
+                "announcements_keys": self._announcements_keys}
+
+    def _read_database_rows(self, repository_obj: Repository) -> int:
+        # Only rows after the high-water marks are read: IDs of the rows inserted by this process are not used,
+        # so rows inserted before them by other processes are not skipped
+        number_new_rows = 0
+        for entity, read_function in [("announcements", repository_obj.get_announcement_basic_info),
+                                      ("vehicles", repository_obj.get_vehicle_basic_info),
+                                      ("sellers", repository_obj.get_seller_basic_info)]:
+            rows = [dict(zip(self.ENTITY_COLUMNS[entity], row)) for row in read_function(min_id=self._max_ids[entity])]
+            with self._lock:
+                # Rows already inserted by this process are not added again:
+                self.insert_many(entity, [row for row in rows
+                                          if self._indexes[entity].get(self.get_key(entity, row)) != row["id"]])
+                if len(rows) > 0:
+                    self._max_ids[entity] = max(self._max_ids[entity] or 0, *[int(row["id"]) for row in rows])
+            number_new_rows += len(rows)
+        return number_new_rows
+
     def set_database_cache(self):
-        # Read announcements:
-        announcements_cache = self._repository_obj.get_announcement_basic_info()
-        self.announcements_cache = pd.DataFrame(announcements_cache, columns=self.announcements_cache.columns)
+        with self._lock:
+            self._reset_cache()
+
+            # Warm start: only rows inserted after the snapshot are read from database
+            snapshot_loaded = self._snapshot_directory is not None and self.load_snapshot()
+            number_new_rows = self._read_database_rows(self._repository_obj)
+
+            # Compact mode: all the keys read from database are moved into the sorted arrays
+            if self._compact:
+                for index in self._get_compact_indexes().values():
+                    index.merge()
+
+            self._logger.set_message(level="DEBUG",
+                                     message_level="MESSAGE",
+                                     message=f"Cache rows read from database: {number_new_rows}")
+            if self._snapshot_directory is not None and (not snapshot_loaded or number_new_rows > 0):
+                self.save_snapshot()
+
+    def refresh(self, repository_obj: Repository = None) -> int:
+        # Delta refresh: rows inserted in database by other processes since the last read
+        if repository_obj is None:
+            # Cache database session is also used by lookups of other threads:
+            with self._lock:
+                number_new_rows = self._read_database_rows(self._repository_obj)
+        else:
+            number_new_rows = self._read_database_rows(repository_obj)
+        self._logger.set_message(level="DEBUG",
+                                 message_level="MESSAGE",
+                                 message=f"Cache refreshed: {number_new_rows} new rows, maximum IDs {self._max_ids}")
+        return number_new_rows
+
+    def _run_refresh(self) -> None:
+        # Database sessions are not shared between threads:
+        repository_obj = Repository()
+        while not self._stop_event.wait(timeout=self._refresh_interval):
+            try:
+                self.refresh(repository_obj)
+            except Exception as exception:
+                self._logger.set_message(level="ERROR",
+                                         message_level="MESSAGE",
+                                         message=f"Cache refresh failed: {str(exception)}")
+
+    def start_refresh(self, refresh_interval: float = None) -> None:
+        if refresh_interval is not None:
+            self._refresh_interval = refresh_interval
+        if self._refresh_interval is None:
+            raise Exception("Cache refresh interval is not defined")
+        if self._refresh_thread is not None:
+            return
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=self._run_refresh, name="cache_refresher", daemon=True)
+        self._refresh_thread.start()
+
+    def stop_refresh(self) -> None:
+        self._stop_event.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join()
+            self._refresh_thread = None
+
+    def _get_snapshot_file(self) -> str:
+        return os.path.join(self._snapshot_directory, self.SNAPSHOT_FILE_NAME)
+
+    def save_snapshot(self) -> None:
+        if self._snapshot_directory is None:
+            raise Exception("Cache snapshot directory is not defined")
+        with self._lock:
+            self._save_snapshot()
+
+    def _save_snapshot(self) -> None:
+        DirectoryOperations.create_dir_by_file_path(self._get_snapshot_file())
+
+        snapshot = {
+            "version": self.SNAPSHOT_VERSION,
+            "compact": self._compact,
+            "max_ids": dict(self._max_ids),
+            "created_date": datetime.now(TIMEZONE_MADRID).isoformat()
+        }
+        if self._compact:
+            # Sorted hashes arrays are saved as NumPy files, so they can be memory-mapped on load:
+            snapshot["snapshot_id"] = str(time.time_ns())
+            snapshot["ambiguous_hashes"] = {}
+            for name, index in self._get_compact_indexes().items():
+                hashes, values, ambiguous_hashes = index.get_arrays()
+                np.save(os.path.join(self._snapshot_directory, f"{name}_hashes.{snapshot['snapshot_id']}.npy"), hashes)
+                np.save(os.path.join(self._snapshot_directory, f"{name}_values.{snapshot['snapshot_id']}.npy"), values)
+                snapshot["ambiguous_hashes"][name] = ambiguous_hashes
+            snapshot["strings"] = {column: interner.strings for column, interner in self._interners.items()}
+            snapshot["rows"] = {entity: {column: (values.typecode, values.tobytes()) for column, values in rows.items()}
+                                for entity, rows in self._rows.items()}
+        else:
+            snapshot["indexes"] = self._indexes
+            snapshot["announcements_ids"] = self._announcements_ids
+            snapshot["announcements_keys"] = self._announcements_keys
+            snapshot["rows"] = self._rows
+
+        # Atomic write: snapshot file is replaced last, so it always points to complete arrays files
+        file_descriptor, temporary_file = tempfile.mkstemp(dir=self._snapshot_directory, suffix=".tmp")
+        os.close(file_descriptor)
+        try:
+            PickleFileOperations.write_file(temporary_file, snapshot)
+            os.replace(temporary_file, self._get_snapshot_file())
+        except Exception:
+            os.remove(temporary_file)
+            raise
+
+        # Old arrays files are removed: memory-mapped files are kept by the processes still using them
+        for array_file in glob.glob(os.path.join(self._snapshot_directory, "*.npy")):
+            if not self._compact or not array_file.endswith(f".{snapshot['snapshot_id']}.npy"):
+                os.remove(array_file)
+
+        self._logger.set_message(level="INFO",
+                                 message_level="MESSAGE",
+                                 message=f"Cache snapshot saved: maximum IDs {self._max_ids}")
+
+    def load_snapshot(self) -> bool:
+        snapshot_file = self._get_snapshot_file()
+        if not os.path.isfile(snapshot_file):
+            return False
+        try:
+            snapshot = PickleFileOperations.read_file(snapshot_file)
+            if snapshot.get("version") != self.SNAPSHOT_VERSION or snapshot.get("compact") != self._compact:
+                self._logger.set_message(level="WARNING",
+                                         message_level="MESSAGE",
+                                         message=f"Cache snapshot {snapshot_file} is not compatible: it is not loaded")
+                return False
+
+            if self._compact:
+                indexes = {}
+                for name, ambiguous_hashes in snapshot["ambiguous_hashes"].items():
+                    array_file = os.path.join(self._snapshot_directory, f"{name}_%s.{snapshot['snapshot_id']}.npy")
+                    indexes[name] = HashIndex.from_arrays(np.load(array_file % "hashes", mmap_mode='r'),
+                                                          np.load(array_file % "values", mmap_mode='r'),
+                                                          ambiguous_hashes)
+                self._announcements_ids = indexes.pop("announcements_ids")
+                self._announcements_keys = indexes.pop("announcements_keys")
+                self._indexes = indexes
+                self._interners = {column: StringInterner.from_strings(strings)
+                                   for column, strings in snapshot["strings"].items()}
+                self._rows = {entity: {column: array(typecode, values_bytes)
+                                       for column, (typecode, values_bytes) in rows.items()}
+                              for entity, rows in snapshot["rows"].items()}
+            else:
+                self._indexes = snapshot["indexes"]
+                self._announcements_ids = snapshot["announcements_ids"]
+                self._announcements_keys = snapshot["announcements_keys"]
+                self._rows = snapshot["rows"]
+            self._max_ids = snapshot["max_ids"]
+        except Exception as exception:
+            self._logger.set_message(level="ERROR",
+                                     message_level="MESSAGE",
+                                     message=f"Cache snapshot {snapshot_file} can not be read: {str(exception)}")
+            self._reset_cache()
+            return False
+
+        self._logger.set_message(level="INFO",
+                                 message_level="MESSAGE",
+                                 message=f"Cache snapshot loaded: maximum IDs {self._max_ids}")
+        return True
+
+    @staticmethod
+    def _get_value(value):
+        # Empty values are the same key in database (None), in dataframes ('') and in pandas (NaN):
+        if value is None or value == '' or value != value:
+            return None
+        return value
+
+    def get_key(self, entity: str, row: dict) -> tuple:
+        return tuple(self._get_value(row.get(column)) for column in self.ENTITY_KEY_COLUMNS[entity])
+
+    def _verify(self, entity: str, key: tuple):
+        # Compact mode hits could be hash collisions: database has the exact answer
+        if entity == "vehicles":
+            rows = self._repository_obj.get_vehicle_id_by_basic_info(*key)
+        elif entity == "sellers":
+            rows = self._repository_obj.get_seller_id_by_basic_info(*key)
+        else:
+            rows = self._repository_obj.get_announcement_id_by_basic_info(*key)
+        return rows[0][0] if rows is not None and len(rows) > 0 else None
+
+    def _check_hit(self, entity: str, key: tuple, entity_id):
+        if entity_id is None or not self._compact:
+            return entity_id
+        if self._verify_hits or self._indexes[entity].is_ambiguous(key):
+            return self._verify(entity, key)
+        return entity_id
+
+    def lookup(self, entity: str, key: tuple):
+        with self._lock:
+            key = tuple(self._get_value(value) for value in key)
+            return self._check_hit(entity, key, self._indexes[entity].get(key))
+
+    def lookup_many(self, entity: str, keys) -> list:
+        with self._lock:
+            index = self._indexes[entity]
+            keys = [tuple(self._get_value(value) for value in key) for key in keys]
+            if self._compact:
+                return [self._check_hit(entity, key, entity_id) for key, entity_id in zip(keys, index.get_many(keys))]
+            return [index.get(key) for key in keys]
+
+    def _append_compact_row(self, entity: str, row: dict) -> None:
+        rows = self._rows[entity]
+        entity_id = self._get_value(row.get("id"))
+        rows["id"].append(-1 if entity_id is None else int(entity_id))
+        for column in self.INTERNED_COLUMNS[entity]:
+            rows[column].append(self._interners[column].get_code(self._get_value(row.get(column))))
+        for column in self.NUMERIC_COLUMNS[entity]:
+            rows[column].append(self._get_number(row.get(column)))
+
+    @staticmethod
+    def _get_number(value) -> float:
+        value = Cache._get_value(value)
+        try:
+            return float("nan") if value is None else float(value)
+        except (TypeError, ValueError):
+            return float("nan")
+
+    def insert(self, entity: str, row: dict) -> tuple:
+        # First ID of a key is kept, as database duplicates are removed keeping the first one:
+        with self._lock:
+            key = self.get_key(entity, row)
+            if self._compact:
+                self._indexes[entity].set_first(key, self._get_value(row.get("id")))
+                self._append_compact_row(entity, row)
+            else:
+                if self._indexes[entity].get(key) is None:
+                    self._indexes[entity][key] = self._get_value(row.get("id"))
+                self._rows[entity].append(tuple(row.get(column) for column in self.ENTITY_COLUMNS[entity]))
+            self._dataframes[entity] = None
+
+            if entity == "announcements":
+                self._announcements_ids.add(self._get_announcement_id_key(row.get("announcer"),
+                                                                          row.get("announcement_id")))
+                self._announcements_keys.add(tuple(self._get_value(row.get(column))
+                                                   for column in self.ANNOUNCEMENT_KEY_COLUMNS))
+            return key
+
+    def insert_many(self, entity: str, rows: list) -> None:
+        with self._lock:
+            for row in rows:
+                self.insert(entity, row)
+
+    @staticmethod
+    def _get_announcement_id_key(announcer, announcement_id) -> tuple:
+        # Announcement IDs are strings in web pages and integers in database:
+        return announcer, None if announcement_id is None else str(announcement_id)
 
-        # Read vehicles:
-        vehicles_cache = self._repository_obj.get_vehicle_basic_info()
-        self.vehicles_cache = pd.DataFrame(vehicles_cache, columns=self.vehicles_cache.columns)
+    def is_announcement_known(self, announcer: str, announcement: dict) -> bool:
+        with self._lock:
+            if self._get_announcement_id_key(announcer, announcement.get("id")) in self._announcements_ids:
+                if not self._verify_hits or \
+                        len(self._repository_obj.get_announcement_id_by_ad_id(announcement.get("id"), announcer)) > 0:
+                    return True
+            key = tuple(self._get_value(announcement.get(column)) for column in self.ANNOUNCEMENT_KEY_COLUMNS)
+            if key in self._announcements_keys:
+                return not self._verify_hits or self._verify("announcements", key + (announcer,)) is not None
+            return False
 
-        # Read sellers:
-        sellers_cache = self._repository_obj.get_seller_basic_info()
-        self.sellers_cache = pd.DataFrame(sellers_cache, columns=self.sellers_cache.columns)
+    def get_new_announcements(self, announcer: str, announcements: list) -> list:
+        # Announcements summaries not in cache, without duplicates and in the same order:
+        with self._lock:
+            new_announcements = []
+            announcements_ids = set()
+            for announcement in announcements:
+                announcement_id = announcement.get("id")
+                if announcement_id in announcements_ids or self.is_announcement_known(announcer, announcement):
+                    continue
+                announcements_ids.add(announcement_id)
+                new_announcements.append(announcement)
+            return new_announcements
 
     def update_database_cache(self,
                               announcements_data: pd.DataFrame = None,
@@ -60,15 +453,15 @@ class Cache:
                               sellers_data: pd.DataFrame = None):
         # Update announcements:
         if announcements_data is not None:
-            self.announcements_cache = pd.concat([self.announcements_cache, announcements_data], ignore_index=True)
+            self.insert_many("announcements", announcements_data.to_dict('records'))
 
         # Update vehicles:
         if vehicles_data is not None:
-            self.vehicles_cache = pd.concat([self.vehicles_cache, vehicles_data], ignore_index=True)
+            self.insert_many("vehicles", vehicles_data.to_dict('records'))
 
         # Update sellers:
         if sellers_data is not None:
-            self.sellers_cache = pd.concat([self.sellers_cache, sellers_data], ignore_index=True)
+            self.insert_many("sellers", sellers_data.to_dict('records'))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+"""
+cache_server.py module
+
+Cache service for many scraper and data extractor processes of the same host: one process keeps the cache and serves
+batch requests (lookups, inserts, new announcements) over a Unix socket, with a JSON line per request and per response.
+Memory does not grow with the number of workers, and all of them see the same inserts.
+"""
+
+
+import json
+import os
+import socket
+import socketserver
+import threading
+
+import pandas as pd
+from src.logger import Logger
+from src.utils import FileOperations
+from src.utils import DirectoryOperations
+from src.utils import ROOT_PATH
+from src.cache import Cache
+
+
+def _get_json_value(value):
+    # NumPy scalars (dataframes records) are sent as Python values:
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _encode_message(message: dict) -> bytes:
+    return (json.dumps(message, default=_get_json_value) + "\n").encode("utf-8")
+
+
+class _CacheRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # One connection per client: requests are answered in order
+        for request_line in self.rfile:
+            self.wfile.write(self.server.cache_server.process_request(request_line))
+            self.wfile.flush()
+
+
+class _CacheUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class CacheServer:
+    METHODS = ["lookup_many", "insert_many", "get_new_announcements", "is_announcement_known", "refresh"]
+
+    def __init__(self,
+                 socket_file: str,
+                 cache_obj: Cache = None,
+                 logger_level="INFO",
+                 **cache_kwargs):
+        self._socket_file = socket_file
+        self._logger_level = logger_level
+        self._cache = Cache(logger_level=logger_level, **cache_kwargs) if cache_obj is None else cache_obj
+        self._server = None
+        self._thread = None
+
+        # Requests are run one by one: database session of the cache is not shared between threads
+        self._lock = threading.Lock()
+
+        # Set logger:
+        self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
+                              level=self._logger_level)
+
+    def process_request(self, request_line: bytes) -> bytes:
+        try:
+            request = json.loads(request_line)
+            if request.get("method") not in self.METHODS:
+                raise Exception(f"Unknown cache method: {request.get('method')}")
+            with self._lock:
+                result = getattr(self._cache, request["method"])(**request.get("params", {}))
+            return _encode_message({"result": result})
+        except Exception as exception:
+            self._logger.set_message(level="ERROR",
+                                     message_level="MESSAGE",
+                                     message=f"Cache request failed: {str(exception)}")
+            return _encode_message({"error": str(exception)})
+
+    def _create_server(self) -> None:
+        # Socket file of a stopped server is replaced:
+        DirectoryOperations.create_dir_by_file_path(self._socket_file)
+        if os.path.exists(self._socket_file):
+            os.remove(self._socket_file)
+        self._server = _CacheUnixServer(self._socket_file, _CacheRequestHandler)
+        self._server.cache_server = self
+        self._logger.set_message(level="INFO",
+                                 message_level="MESSAGE",
+                                 message=f"Cache server listening on {self._socket_file}")
+
+    def start(self) -> None:
+        self._create_server()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="cache_server", daemon=True)
+        self._thread.start()
+
+    def serve_forever(self) -> None:
+        self._create_server()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.stop()
+
+    def stop(self) -> None:
+        if self._server is None:
+            return
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        self._server = None
+        self._cache.stop_refresh()
+        if os.path.exists(self._socket_file):
+            os.remove(self._socket_file)
+
+
+class CacheClient:
+    # Same interface than Cache: it can be shared by web scrapers and data extractors
+    ENTITY_KEY_COLUMNS = Cache.ENTITY_KEY_COLUMNS
+    ANNOUNCEMENT_KEY_COLUMNS = Cache.ANNOUNCEMENT_KEY_COLUMNS
+
+    # Only read requests are sent again: an insert could have already been applied by the server
+    RETRY_METHODS = ["lookup_many", "is_announcement_known", "get_new_announcements"]
+
+    def __init__(self,
+                 socket_file: str,
+                 timeout: float = 60,
+                 logger_level="INFO"):
+        self._socket_file = socket_file
+        self._timeout = timeout
+        self._logger_level = logger_level
+        self._lock = threading.Lock()
+        self._socket = None
+        self._socket_file_obj = None
+
+        # Set logger:
+        self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
+                              level=self._logger_level)
+
+    def _connect(self) -> None:
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(self._timeout)
+        self._socket.connect(self._socket_file)
+        self._socket_file_obj = self._socket.makefile('rb')
+
+    def close(self) -> None:
+        if self._socket is not None:
+            self._socket_file_obj.close()
+            self._socket.close()
+            self._socket = None
+            self._socket_file_obj = None
+
+    def _send_request(self, method: str, **params):
+        request = _encode_message({"method": method, "params": params})
+        with self._lock:
+            # Connection is opened again if the server closed it, and read requests are sent once more:
+            number_attempts = 2 if method in self.RETRY_METHODS else 1
+            for attempt in range(number_attempts):
+                try:
+                    if self._socket is None:
+                        self._connect()
+                    self._socket.sendall(request)
+                    response_line = self._socket_file_obj.readline()
+                    if not response_line:
+                        raise ConnectionError("Cache server closed the connection")
+                    break
+                except (ConnectionError, socket.timeout) as exception:
+                    self.close()
+                    if attempt == number_attempts - 1:
+                        raise Exception(f"Cache server {self._socket_file} is not available: {str(exception)}")
+
+        response = json.loads(response_line)
+        if "error" in response:
+            raise Exception(f"Cache server error: {response['error']}")
+        return response["result"]
+
+    def lookup(self, entity: str, key: tuple):
+        return self.lookup_many(entity, [key])[0]
+
+    def lookup_many(self, entity: str, keys) -> list:
+        return self._send_request("lookup_many", entity=entity, keys=[list(key) for key in keys])
+
+    def insert(self, entity: str, row: dict) -> None:
+        self.insert_many(entity, [row])
+
+    def insert_many(self, entity: str, rows: list) -> None:
+        self._send_request("insert_many", entity=entity, rows=rows)
+
+    def is_announcement_known(self, announcer: str, announcement: dict) -> bool:
+        return self._send_request("is_announcement_known", announcer=announcer, announcement=announcement)
+
+    def get_new_announcements(self, announcer: str, announcements: list) -> list:
+        return self._send_request("get_new_announcements", announcer=announcer, announcements=announcements)
+
+    def update_database_cache(self,
+                              announcements_data: pd.DataFrame = None,
+                              vehicles_data: pd.DataFrame = None,
+                              sellers_data: pd.DataFrame = None):
+        for entity, data in [("announcements", announcements_data),
+                             ("vehicles", vehicles_data),
+                             ("sellers", sellers_data)]:
+            if data is not None:
+                self.insert_many(entity, data.to_dict('records'))
+
+    def refresh(self, repository_obj=None) -> int:
+        # Server cache is refreshed with its own database session:
+        return self._send_request("refresh")
+
+    def stop_refresh(self) -> None:
+        # Cache refresh is managed by the server
+        return
+
+
+if __name__ == "__main__":
+    cache_server = CacheServer(socket_file=ROOT_PATH + "/outputs/cache_server.sock", logger_level="INFO")
+    cache_server.serve_forever()
@@ -0,0 +1,164 @@
+"""
+checkpoint.py module
+
+Crash-safe crawl checkpoint: completed pages watermark, announcements details still pending per page, next search page,
+outputs folder and a proxies pool snapshot are saved atomically on a JSON file (temporary file and rename), so a stopped
+web scraper run can be resumed exactly where it stopped. Checkpoints of other search filters or sort are not resumed.
+"""
+
+
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Callable
+
+from src.logger import Logger
+from src.utils import FileOperations
+from src.utils import DirectoryOperations
+from src.utils import JSONFileOperations
+from src.utils import TIMEZONE_MADRID
+
+
+class CrawlCheckpoint:
+    def __init__(self,
+                 checkpoint_file: str,
+                 save_interval: float = 5,
+                 proxies_function: Callable = None,
+                 logger_level="INFO"):
+        self._checkpoint_file = checkpoint_file
+        self._save_interval = save_interval
+        self._proxies_function = proxies_function
+        self._logger_level = logger_level
+
+        self._lock = threading.Lock()
+        self._last_save_time = 0.0
+        self._state = {
+            "outputs_folder": None,
+            "search_filters": None,
+            "sort_term": None,
+            "next_page": None,
+            "completed_until": None,
+            "pending_details": {},
+            "proxies": []
+        }
+
+        # Set logger:
+        self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
+                              level=self._logger_level)
+
+    @property
+    def next_page(self) -> int:
+        return self._state["next_page"]
+
+    @property
+    def outputs_folder(self) -> str:
+        return self._state["outputs_folder"]
+
+    def load(self, search_filters: dict = None, sort_term: str = None) -> bool:
+        if not os.path.isfile(self._checkpoint_file):
+            return False
+        try:
+            state = JSONFileOperations.read_file(self._checkpoint_file)
+        except Exception as exception:
+            self._logger.set_message(level="ERROR",
+                                     message_level="MESSAGE",
+                                     message=f"Checkpoint {self._checkpoint_file} can not be read: {str(exception)}")
+            return False
+
+        # Only a run with the same search is resumed: other checkpoints are replaced on start
+        if state.get("search_filters") != search_filters or state.get("sort_term") != sort_term:
+            self._logger.set_message(level="WARNING",
+                                     message_level="MESSAGE",
+                                     message=f"Checkpoint {self._checkpoint_file} is not resumed: search filters or "
+                                             f"sort are not the same")
+            return False
+
+        with self._lock:
+            self._state.update(state)
+        self._logger.set_message(level="INFO",
+                                 message_level="MESSAGE",
+                                 message=f"Checkpoint loaded: next page {self.next_page}, "
+                                         f"{len(self._state['pending_details'])} pages with pending details")
+        return True
+
+    def start(self,
+              outputs_folder: str,
+              search_filters: dict = None,
+              sort_term: str = None,
+              next_page: int = 0) -> None:
+        with self._lock:
+            self._state["outputs_folder"] = outputs_folder
+            self._state["search_filters"] = search_filters
+            self._state["sort_term"] = sort_term
+            if self._state["next_page"] is None:
+                self._state["next_page"] = next_page
+                self._state["completed_until"] = next_page
+        self.save(force=True)
+
+    def get_pending_details(self) -> dict:
+        # JSON keys are strings: pages are returned as integers
+        with self._lock:
+            return {int(page): list(announcements.values())
+                    for page, announcements in self._state["pending_details"].items()}
+
+    def get_proxies(self) -> list:
+        with self._lock:
+            return list(self._state["proxies"])
+
+    def set_page_started(self, page: int, announcements: list, announcement_id_function: Callable) -> None:
+        with self._lock:
+            self._state["pending_details"][str(page)] = {
+                str(announcement_id_function(announcement)): announcement for announcement in announcements
+            }
+            self._state["next_page"] = max(self._state["next_page"] or 0, page + 1)
+        self.save(force=True)
+
+    def set_detail_done(self, page: int, announcement_id) -> None:
+        with self._lock:
+            page_pending_details = self._state["pending_details"].get(str(page))
+            if page_pending_details is not None:
+                page_pending_details.pop(str(announcement_id), None)
+        self.save()
+
+    def set_page_completed(self, page: int) -> None:
+        with self._lock:
+            # Watermark: all the pages before it are completed, next ones are completed or still pending
+            self._state["pending_details"].pop(str(page), None)
+            self._state["completed_until"] = min([int(pending_page) for pending_page in self._state["pending_details"]],
+                                                 default=self._state["next_page"])
+        self.save(force=True)
+
+    def _write_file(self, state: dict) -> None:
+        # Atomic write: readers see the old checkpoint or the new one, never a partial file
+        DirectoryOperations.create_dir_by_file_path(self._checkpoint_file)
+        file_descriptor, temporary_file = tempfile.mkstemp(dir=os.path.dirname(self._checkpoint_file),
+                                                           suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, 'w', encoding="utf-8") as json_obj:
+                json.dump(state, json_obj, default=str)
+                json_obj.flush()
+                os.fsync(json_obj.fileno())
+            os.replace(temporary_file, self._checkpoint_file)
+        except Exception:
+            os.remove(temporary_file)
+            raise
+
+    def save(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last_save_time < self._save_interval:
+            return
+
+        with self._lock:
+            self._last_save_time = now
+            if self._proxies_function is not None:
+                self._state["proxies"] = self._proxies_function()
+            self._state["created_date"] = datetime.now(TIMEZONE_MADRID).isoformat()
+            self._write_file(self._state)
+
+    def remove(self) -> None:
+        with self._lock:
+            if os.path.isfile(self._checkpoint_file):
+                os.remove(self._checkpoint_file)
@@ -1,4 +1,8 @@
+import copy
+import json
+import math
 import re
+import threading
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -86,20 +90,62 @@ class CochesNetAPIData:
 
 
 class CochesNetAPI(CochesNetAPIData):
+    SORT_TERM_RELEVANCE = "relevance"
+    SORT_TERM_PUBLICATION_DATE = "publicationDate"
+
+    # Page value placeholder of the serialized search bodies:
+    _page_placeholder = "__PAGE__"
+
+    # Search bodies are serialized once per filters: bytes before and after the page value
+    _search_templates = {}
+    _search_templates_lock = threading.Lock()
+
     def __init__(self):
         self.page_name = "coches.net"
         self.url_search_listing = self.base_url + "/search/listing"
         self.url_announcement_detail = self.base_url + "/details/{id}"
 
-    def get_request_search_by_date_desc(self, page: int) -> dict:
-        body = self.search_default_body.copy()
-        body["pagination"]["page"] = page
+    @staticmethod
+    def _update_body(body: dict, values: dict) -> None:
+        for key, value in values.items():
+            if isinstance(value, dict) and isinstance(body.get(key), dict):
+                CochesNetAPI._update_body(body[key], value)
+            else:
+                body[key] = copy.deepcopy(value)
+
+    def _create_search_template(self, filters: dict = None, sort_term: str = None) -> tuple:
+        # Default body is never modified: templates are built from a deep copy
+        body = copy.deepcopy(self.search_default_body)
+        if filters is not None:
+            self._update_body(body["filters"], filters)
+        if sort_term is not None:
+            body["sort"]["term"] = sort_term
+        body["pagination"]["page"] = self._page_placeholder
+
+        body_bytes = json.dumps(body, separators=(",", ":")).encode("utf-8")
+        prefix, suffix = body_bytes.split(json.dumps(self._page_placeholder).encode("utf-8"))
+        return prefix, suffix
+
+    def _get_search_template(self, filters: dict = None, sort_term: str = None) -> tuple:
+        template_key = (None if filters is None else json.dumps(filters, sort_keys=True), sort_term)
+        template = self._search_templates.get(template_key)
+        if template is None:
+            with self._search_templates_lock:
+                template = self._search_templates.get(template_key)
+                if template is None:
+                    template = self._create_search_template(filters, sort_term)
+                    self._search_templates[template_key] = template
+        return template
+
+    def get_request_search_by_date_desc(self, page: int, filters: dict = None, sort_term: str = None) -> dict:
+        # Only page bytes are added to the immutable template, so it is safe to call it from many threads:
+        prefix, suffix = self._get_search_template(filters, sort_term)
 
         request = {
             "method": "POST",
             "url": self.url_search_listing,
             "headers": self.headers,
-            "json": body
+            "data": prefix + str(int(page)).encode("utf-8") + suffix
         }
         return request
 
@@ -111,15 +157,32 @@ class CochesNetAPI(CochesNetAPIData):
         }
         return request
 
-    def get_number_pages(self, response: dict) -> int:
+    def get_page_size(self) -> int:
+        return self.search_default_body["pagination"]["size"]
+
+    def get_number_results(self, response: dict) -> int:
         return response["meta"]["totalResults"]
 
+    def get_number_pages(self, response: dict) -> int:
+        # Total results are items: pages are rounded up with the page size
+        return math.ceil(self.get_number_results(response) / self.get_page_size())
+
+    def get_page_plan(self, response: dict, start_page: int = 0, end_page: int = None) -> range:
+        # Pages start at 0: last page is the number of pages minus one
+        last_page = self.get_number_pages(response) - 1
+        if end_page is not None:
+            last_page = min(last_page, end_page)
+        return range(start_page, last_page + 1)
+
     def get_announcements(self, response: dict) -> list:
         return response["items"]
 
     def get_announcement_id(self, annnouncement: dict) -> int:
         return annnouncement["id"]
 
+    def get_announcement_publication_date(self, annnouncement: dict):
+        return CochesNetData._get_model_value(annnouncement, ["publicationDate"])
+
     def get_announcement_summary(self, annnouncement: dict) -> dict:
         return {
             "id": annnouncement["id"],
@@ -0,0 +1,171 @@
+"""
+compact_index.py module
+
+Compact structures of the cache: natural keys are stored as 64 bits hashes in sorted NumPy arrays (with a small dict of
+recent inserts, merged from time to time), and repeated strings are interned into integer codes. Hashes found with
+different IDs are marked as ambiguous, so the cache can check them in database.
+"""
+
+
+import hashlib
+import numbers
+import struct
+
+import numpy as np
+
+
+class StringInterner:
+    def __init__(self):
+        self._codes = {}
+        self.strings = []
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+    def get_code(self, string) -> int:
+        # Empty values are -1 (NaN in categorical dataframes columns):
+        if string is None:
+            return -1
+        code = self._codes.get(string)
+        if code is None:
+            code = len(self.strings)
+            self._codes[string] = code
+            self.strings.append(string)
+        return code
+
+    def get_string(self, code: int):
+        return None if code < 0 else self.strings[code]
+
+    @classmethod
+    def from_strings(cls, strings: list):
+        string_interner = cls()
+        for string in strings:
+            string_interner.get_code(string)
+        return string_interner
+
+
+class HashIndex:
+    # Values are integers: None is saved as -1
+    _empty_value = -1
+
+    def __init__(self, min_merge_size: int = 10000):
+        self._min_merge_size = min_merge_size
+        self._base = (np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64))
+        self._delta = {}
+        self._ambiguous_hashes = set()
+
+    def __len__(self) -> int:
+        return len(self._base[0]) + len(self._delta)
+
+    def __contains__(self, key: tuple) -> bool:
+        return self._get_hash_value(self.get_hash(key)) is not None
+
+    @property
+    def nbytes(self) -> int:
+        return self._base[0].nbytes + self._base[1].nbytes
+
+    @staticmethod
+    def _get_canonical_value(value) -> str:
+        # Same numbers are the same key whatever their type is (2015, 2015.0, numpy.int64(2015)):
+        if isinstance(value, bool) or value is None:
+            return repr(value)
+        if isinstance(value, numbers.Integral):
+            return repr(int(value))
+        if isinstance(value, numbers.Real):
+            value = float(value)
+            return repr(int(value)) if value.is_integer() else repr(value)
+        return repr(str(value))
+
+    @staticmethod
+    def get_hash(key: tuple) -> int:
+        key_text = "\x1f".join(HashIndex._get_canonical_value(value) for value in key)
+        return struct.unpack("<Q", hashlib.blake2b(key_text.encode("utf-8"), digest_size=8).digest())[0]
+
+    def _get_hash_value(self, key_hash: int):
+        # Delta values are never None (empty values are -1): a merge can not remove the key between two reads
+        delta_value = self._delta.get(key_hash)
+        if delta_value is not None:
+            return delta_value
+        hashes, values = self._base
+        position = int(np.searchsorted(hashes, np.uint64(key_hash)))
+        if position < len(hashes) and int(hashes[position]) == key_hash:
+            return int(values[position])
+        return None
+
+    def _get_value(self, value):
+        return None if value is None or value == self._empty_value else value
+
+    def is_ambiguous(self, key: tuple) -> bool:
+        return self.get_hash(key) in self._ambiguous_hashes
+
+    def get(self, key: tuple, default=None):
+        value = self._get_value(self._get_hash_value(self.get_hash(key)))
+        return default if value is None else value
+
+    def get_many(self, keys) -> list:
+        # Recent inserts are read before the sorted hashes, like single reads: a merge in between moves them into the
+        # new arrays before they are removed from the delta, so they are not missed
+        keys_hashes = [self.get_hash(key) for key in keys]
+        delta_values = [self._delta.get(key_hash) for key_hash in keys_hashes]
+        hashes, values = self._base
+
+        # Vectorized search in the sorted hashes of the keys not found in recent inserts:
+        results = [self._get_value(value) for value in delta_values]
+        search_indexes = [index for index, value in enumerate(delta_values) if value is None]
+        if len(hashes) > 0 and len(search_indexes) > 0:
+            search_hashes = np.array([keys_hashes[index] for index in search_indexes], dtype=np.uint64)
+            positions = np.minimum(np.searchsorted(hashes, search_hashes), len(hashes) - 1)
+            found = hashes[positions] == search_hashes
+            for position_index in np.flatnonzero(found):
+                results[search_indexes[position_index]] = self._get_value(int(values[positions[position_index]]))
+        return results
+
+    def set_first(self, key: tuple, value=None) -> None:
+        # First value of a hash is kept: a different value means duplicated keys or a hash collision
+        key_hash = self.get_hash(key)
+        value = self._empty_value if value is None else int(value)
+        current_value = self._get_hash_value(key_hash)
+        if current_value is None or (current_value == self._empty_value and value != self._empty_value):
+            self._delta[key_hash] = value
+            if len(self._delta) >= max(self._min_merge_size, len(self._base[0]) // 4):
+                self.merge()
+        elif current_value != value and value != self._empty_value:
+            self._ambiguous_hashes.add(key_hash)
+
+    def add(self, key: tuple) -> None:
+        self.set_first(key)
+
+    def get_arrays(self) -> tuple:
+        self.merge()
+        hashes, values = self._base
+        return hashes, values, set(self._ambiguous_hashes)
+
+    @classmethod
+    def from_arrays(cls, hashes: np.ndarray, values: np.ndarray, ambiguous_hashes: set = None):
+        # Arrays can be memory-mapped read-only: merges always build new arrays
+        hash_index = cls()
+        hash_index._base = (hashes, values)
+        hash_index._ambiguous_hashes = set() if ambiguous_hashes is None else set(ambiguous_hashes)
+        return hash_index
+
+    def merge(self) -> None:
+        if len(self._delta) == 0:
+            return
+        hashes, values = self._base
+        delta = dict(self._delta)
+        delta_hashes = np.fromiter(delta.keys(), dtype=np.uint64, count=len(delta))
+        delta_values = np.fromiter(delta.values(), dtype=np.int64, count=len(delta))
+
+        # Updated values of base hashes are replaced, new hashes are merged in order:
+        in_base = np.isin(delta_hashes, hashes)
+        if in_base.any():
+            values = values.copy()
+            values[np.searchsorted(hashes, delta_hashes[in_base])] = delta_values[in_base]
+        new_hashes = np.concatenate([hashes, delta_hashes[~in_base]])
+        new_values = np.concatenate([values, delta_values[~in_base]])
+        order = np.argsort(new_hashes, kind="stable")
+
+        # Readers see old arrays with the delta, or new arrays:
+        self._base = (new_hashes[order], new_values[order])
+        for key_hash in delta:
+            self._delta.pop(key_hash, None)
@@ -0,0 +1,135 @@
+"""
+concurrency_controller.py module
+
+AIMD (additive increase, multiplicative decrease) controller of the number of requests in flight. The limit is raised
+while latency and errors are low, and it is cut as soon as the error rate, the latency or the BOT detections grow, so
+the scrapers adapt to the quality of the current proxies list.
+"""
+
+
+import asyncio
+import collections
+import threading
+import time
+
+
+class ConcurrencyController:
+    def __init__(self,
+                 initial_limit: int = 5,
+                 min_limit: int = 1,
+                 max_limit: int = 50,
+                 additive_increase: int = 1,
+                 multiplicative_decrease: float = 0.5,
+                 latency_target: float = 5.0,
+                 error_rate_threshold: float = 0.25,
+                 window_size: int = 20,
+                 decrease_interval: float = 5.0):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self._limit = float(max(min_limit, min(max_limit, initial_limit)))
+        self._additive_increase = additive_increase
+        self._multiplicative_decrease = multiplicative_decrease
+        self._latency_target = latency_target
+        self._error_rate_threshold = error_rate_threshold
+        self._window_size = window_size
+        self._decrease_interval = decrease_interval
+
+        self._in_flight = 0
+        self._samples = collections.deque(maxlen=window_size)
+        self._new_samples = 0
+        self._last_decrease_time = 0.0
+        self._total_requests = 0
+        self._total_errors = 0
+        self._total_bans = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self._in_flight < int(self._limit):
+                self._in_flight += 1
+                return True
+            return False
+
+    def acquire(self, timeout: float = None) -> bool:
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._in_flight < int(self._limit), timeout=timeout):
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def _decrease(self, now: float) -> None:
+        # Several requests in flight fail at the same time: only one decrease per interval
+        if now - self._last_decrease_time < self._decrease_interval:
+            return
+        self._limit = max(self.min_limit, self._limit * self._multiplicative_decrease)
+        self._last_decrease_time = now
+
+    def _increase(self) -> None:
+        self._limit = min(self.max_limit, self._limit + self._additive_increase)
+
+    def record(self, latency: float, success: bool, banned: bool = False) -> None:
+        with self._condition:
+            now = time.monotonic()
+            self._samples.append((latency, success))
+            self._new_samples += 1
+            self._total_requests += 1
+            self._total_errors += 0 if success else 1
+            self._total_bans += 1 if banned else 0
+
+            if banned:
+                self._decrease(now)
+            elif self._new_samples >= self._window_size:
+                # Evaluate a complete window of samples:
+                self._new_samples = 0
+                error_rate = sum(1 for _, sample_success in self._samples if not sample_success) / len(self._samples)
+                latency_avg = sum(sample_latency for sample_latency, _ in self._samples) / len(self._samples)
+                if error_rate > self._error_rate_threshold or latency_avg > self._latency_target:
+                    self._decrease(now)
+                else:
+                    self._increase()
+            self._condition.notify_all()
+
+    def get_metrics(self) -> dict:
+        with self._condition:
+            number_samples = len(self._samples)
+            return {
+                "concurrency_limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "latency_avg": sum(latency for latency, _ in self._samples) / number_samples if number_samples else None,
+                "error_rate": sum(1 for _, success in self._samples if not success) / number_samples if number_samples else None,
+                "total_requests": self._total_requests,
+                "total_errors": self._total_errors,
+                "total_bans": self._total_bans
+            }
+
+
+class AsyncConcurrencyLimiter:
+    def __init__(self, controller: ConcurrencyController):
+        self._controller = controller
+        self._condition = None
+
+    async def __aenter__(self):
+        # Condition is created inside the running event loop:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(self._controller.try_acquire)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._controller.release()
+        async with self._condition:
+            self._condition.notify_all()
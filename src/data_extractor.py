@@ -30,6 +30,7 @@ class DataExtractor:
     def __init__(self,
                  files_directory: str = ROOT_PATH + "/outputs/**/",
                  repository_obj: Repository = None,
+                 cache_obj: Cache = None,
                  logger_level="INFO"):
         self._logger_level = logger_level
         self.inputs_folder = files_directory
@@ -40,7 +41,8 @@ class DataExtractor:
         self._cochesNet_data = CochesNetData()
 
         self._repository_obj = Repository() if repository_obj is None else repository_obj
-        self._cache = Cache()
+        # Cache is shared with the web scraper for the whole run: it is only read from database when it is needed
+        self._cache = cache_obj
 
         self.vehicle_main_data = {
             "make": None,
@@ -53,6 +55,11 @@ class DataExtractor:
         self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
                               level=self._logger_level)
 
+    def _get_cache(self) -> Cache:
+        if self._cache is None:
+            self._cache = Cache(logger_level=self._logger_level)
+        return self._cache
+
     def _set_detail_files_pattern(self, search_page: str):
         self._detail_files_pattern = f"{search_page}/detail_*.json"
         return self._detail_files_pattern
@@ -70,27 +77,16 @@ class DataExtractor:
         ads_summary = []
         for number, announcement in enumerate(self._page_api.get_announcements(search_data)):
             ads_summary.append(self._page_api.get_announcement_summary(announcement))
-        ads_summary_df = pd.DataFrame(ads_summary)
-
-        # Remove duplicated data:
-        ads_summary_df = ads_summary_df.drop_duplicates()
-
-        # Check data is in cache (BBDD) or not:
-        check_columns = ["title", "vehicle_year", "vehicle_km", "price"]
-        merge_df = ads_summary_df.merge(self._cache.announcements_cache[check_columns],
-                                        on=check_columns,
-                                        how='left',
-                                        indicator=True)
-        ads_summary_df = merge_df[merge_df['_merge'] == 'left_only'].drop('_merge', axis=1)
 
-        return ads_summary_df.to_dict('records')
+        # Check data is in cache (BBDD) or not: hash indexes probes, without duplicates
+        return self._get_cache().get_new_announcements(announcer=self._page_api.page_name, announcements=ads_summary)
 
     @staticmethod
     def _get_file_creation_date(file_path):
         c_time = os.path.getctime(file_path)
         return str(datetime.fromtimestamp(c_time).strftime("%Y-%m-%dT%H:%M:%S:%fZ"))
 
-    def run(self):
+    def run(self, files_directory: str = None):
         self._logger.set_message(level="INFO",
                                  message_level="SECTION",
                                  message="Start Data Extractor")
@@ -100,8 +96,9 @@ class DataExtractor:
         new_vehicles = 0
         new_sellers = 0
 
-        # Read pages JSONs:
-        json_searchs_paths = DirectoryOperations.find_files_using_pattern(self.inputs_folder + "*.json")
+        # Read pages JSONs: the same data extractor can be run on many directories
+        inputs_folder = self.inputs_folder if files_directory is None else files_directory
+        json_searchs_paths = DirectoryOperations.find_files_using_pattern(inputs_folder + "*.json")
 
         # Read search data:
         for json_search_path in json_searchs_paths:
@@ -214,7 +211,9 @@ class DataExtractor:
                                          f"\n\tNew vehicles: {new_vehicles}"
                                          f"\n\tNew sellers: {new_sellers}")
 
-        # TODO: Update cache
+        # Update cache incrementally: only rows after the cache high-water marks are read, with their database IDs
+        if self._cache is not None and new_announcements + new_vehicles + new_sellers > 0:
+            self._cache.refresh(self._repository_obj)
 
 
 if __name__ == "__main__":
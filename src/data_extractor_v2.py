@@ -32,13 +32,11 @@ class DataExtractor:
                  files_directory: str = ROOT_PATH + "/outputs/**/",
                  page: int = None,
                  repository_obj: Repository = None,
+                 cache_obj: Cache = None,
                  logger_level="INFO"):
         self._logger_level = logger_level
         self.page = page
-        if self.page is None:
-            self.inputs_folder = files_directory + "*.json"
-        else:
-            self.inputs_folder = files_directory + f"page_{self.page}.json"
+        self.inputs_folder = self._get_inputs_pattern(files_directory)
 
         # self.outputs_folder = self.inputs_folder + "/jsons/"
 
@@ -47,7 +45,8 @@ class DataExtractor:
         self._cochesNet_data = CochesNetData()
 
         self._repository_obj = Repository() if repository_obj is None else repository_obj
-        self._cache = Cache()
+        # Cache is shared with the web scraper for the whole run:
+        self._cache = Cache(logger_level=self._logger_level) if cache_obj is None else cache_obj
 
         self.vehicle_main_data = {
             "make": None,
@@ -60,6 +59,11 @@ class DataExtractor:
         self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
                               level=self._logger_level)
 
+    def _get_inputs_pattern(self, files_directory: str) -> str:
+        if self.page is None:
+            return files_directory + "*.json"
+        return files_directory + f"page_{self.page}.json"
+
     def _set_detail_files_pattern(self, search_page: str):
         self._detail_files_pattern = f"{search_page}/detail_*.json"
         return self._detail_files_pattern
@@ -69,20 +73,9 @@ class DataExtractor:
         ads_summary = []
         for number, announcement in enumerate(self._page_api.get_announcements(search_data)):
             ads_summary.append(self._page_api.get_announcement_summary(announcement))
-        ads_summary_df = pd.DataFrame(ads_summary)
-
-        # Remove duplicated data:
-        ads_summary_df = ads_summary_df.drop_duplicates()
-
-        # Check data is in cache (BBDD) or not:
-        check_columns = ["title", "vehicle_year", "vehicle_km", "price"]
-        merge_df = ads_summary_df.merge(self._cache.announcements_cache[check_columns],
-                                        on=check_columns,
-                                        how='left',
-                                        indicator=True)
-        ads_summary_df = merge_df[merge_df['_merge'] == 'left_only'].drop('_merge', axis=1)
 
-        return ads_summary_df.to_dict('records')
+        # Check data is in cache (BBDD) or not: hash indexes probes, without duplicates
+        return self._cache.get_new_announcements(announcer=self._page_api.page_name, announcements=ads_summary)
 
     def convert_list_into_df(self, data_list):
         # Convert list into dataframe:
@@ -93,16 +86,13 @@ class DataExtractor:
         return data_df
 
     def get_complete_entity_df(self,
-                               cache_df: pd.DataFrame,
-                               check_columns: list,
+                               entity: str,
                                data_df: pd.DataFrame) -> pd.DataFrame:
-        # Check data is in cache (BBDD) or not - remove BBDD duplicates:
+        # Check data is in cache (BBDD) or not: one hash index lookup per row
         new_data_df = data_df.copy()
-        merge_df = new_data_df.merge(cache_df.drop_duplicates(keep='first'),
-                                 on=check_columns,
-                                 how='left',
-                                 indicator=False)
-        new_data_df["id"] = merge_df["id"].fillna(value='')
+        keys = zip(*[new_data_df[column] for column in self._cache.ENTITY_KEY_COLUMNS[entity]])
+        new_data_df["id"] = ['' if entity_id is None else entity_id
+                             for entity_id in self._cache.lookup_many(entity, keys)]
         return new_data_df
 
     def get_entity_df_to_insert(self, data_df: pd.DataFrame, filter_null_columns: list = []):
@@ -122,10 +112,7 @@ class DataExtractor:
         data_df = self.convert_list_into_df(data_list)
 
         # Extract only new data:
-        check_db_columns = ["make", "model", "version", "year"]
-        new_data_df = self.get_complete_entity_df(cache_df=self._cache.vehicles_cache,
-                                              check_columns=check_db_columns,
-                                              data_df=data_df)
+        new_data_df = self.get_complete_entity_df(entity="vehicles", data_df=data_df)
         new_data_df = self.get_entity_df_to_insert(new_data_df, filter_null_columns=['make', 'model'])
 
         # Insert data:
@@ -137,9 +124,7 @@ class DataExtractor:
             self._cache.update_database_cache(vehicles_data=new_data_df)
 
             # Update complete dataframe:
-            data_df = self.get_complete_entity_df(cache_df=self._cache.vehicles_cache,
-                                                  check_columns=check_db_columns,
-                                                  data_df=data_df)
+            data_df = self.get_complete_entity_df(entity="vehicles", data_df=data_df)
         return data_df, len(new_data_df)
 
     def insert_sellers(self, data_list: list):
@@ -147,10 +132,7 @@ class DataExtractor:
         data_df = self.convert_list_into_df(data_list)
 
         # Extract only new data:
-        check_db_columns = ["name", "province"]
-        new_data_df = self.get_complete_entity_df(cache_df=self._cache.sellers_cache,
-                                              check_columns=check_db_columns,
-                                              data_df=data_df)
+        new_data_df = self.get_complete_entity_df(entity="sellers", data_df=data_df)
         new_data_df = self.get_entity_df_to_insert(new_data_df, filter_null_columns=['name'])
 
         # Insert data:
@@ -162,9 +144,7 @@ class DataExtractor:
             self._cache.update_database_cache(sellers_data=new_data_df)
 
             # Update complete dataframe:
-            data_df = self.get_complete_entity_df(cache_df=self._cache.sellers_cache,
-                                                  check_columns=check_db_columns,
-                                                  data_df=data_df)
+            data_df = self.get_complete_entity_df(entity="sellers", data_df=data_df)
         return data_df, len(new_data_df)
 
     def insert_announcements(self, data_list: list, vehicles_ids, sellers_ids):
@@ -174,10 +154,7 @@ class DataExtractor:
         # Extract only new data:
         data_df["vehicle_id"] = vehicles_ids
         data_df["seller_id"] = sellers_ids
-        check_db_columns = ["title", "vehicle_year", "vehicle_km", "price", "announcer"]
-        new_data_df = self.get_complete_entity_df(cache_df=self._cache.announcements_cache,
-                                              check_columns=check_db_columns,
-                                              data_df=data_df)
+        new_data_df = self.get_complete_entity_df(entity="announcements", data_df=data_df)
         new_data_df = self.get_entity_df_to_insert(new_data_df, filter_null_columns=['title'])
 
         # Insert data:
@@ -189,9 +166,7 @@ class DataExtractor:
             self._cache.update_database_cache(announcements_data=new_data_df)
 
             # Update complete dataframe:
-            data_df = self.get_complete_entity_df(cache_df=self._cache.announcements_cache,
-                                                  check_columns=check_db_columns,
-                                                  data_df=data_df)
+            data_df = self.get_complete_entity_df(entity="announcements", data_df=data_df)
         return data_df, len(new_data_df)
 
     @staticmethod
@@ -200,7 +175,7 @@ class DataExtractor:
         # return str(datetime.fromtimestamp(c_time).strftime("%Y-%m-%dT%H:%M:%S:%fZ"))
         return datetime.fromtimestamp(c_time)
 
-    def run(self):
+    def run(self, files_directory: str = None):
         self._logger.set_message(level="INFO",
                                  message_level="SECTION",
                                  message="Start Data Extractor")
@@ -210,8 +185,9 @@ class DataExtractor:
         new_vehicles = 0
         new_sellers = 0
 
-        # Read pages JSONs:
-        json_searchs_paths = DirectoryOperations.find_files_using_pattern(self.inputs_folder)
+        # Read pages JSONs: the same data extractor can be run on many directories
+        inputs_folder = self.inputs_folder if files_directory is None else self._get_inputs_pattern(files_directory)
+        json_searchs_paths = DirectoryOperations.find_files_using_pattern(inputs_folder)
 
         # Read search data:
         for json_search_path in json_searchs_paths:
@@ -314,4 +290,5 @@ class DataExtractor:
                                          f"\n\tNew vehicles: {new_vehicles}"
                                          f"\n\tNew sellers: {new_sellers}")
 
-        # TODO: Update cache
+        # Update cache: rows inserted by other extractors or scrapers in the same database
+        self._cache.refresh(self._repository_obj)
@@ -1,10 +1,122 @@
+import asyncio
+import codecs
+import collections
+import http.cookiejar
+import json as json_lib
+import threading
+import time
+import weakref
+from dataclasses import dataclass, field
+
+import aiohttp
 import requests
+from requests.adapters import HTTPAdapter
+
+
+@dataclass
+class AsyncResponse:
+    url: str
+    status_code: int
+    headers: dict = field(default_factory=dict)
+    content: bytes = b""
+    text: str = ""
+
+    def json(self):
+        return json_lib.loads(self.text)
+
+
+@dataclass
+class _PooledSession:
+    # Sessions in use are closed by their last user: evicted sessions are only removed from the pool
+    session: requests.Session
+    last_used: float
+    number_users: int = 0
+    evicted: bool = False
 
 
 class Postman:
+    # Keep-alive sessions, one connection pool per proxy, in LRU order:
+    _max_sessions = 256
+    _session_idle_time = 300
+    _pool_maxsize = 10
+    _sessions = collections.OrderedDict()
+    _sessions_lock = threading.Lock()
+
+    # Asynchronous transport: one shared session (and connector) per event loop:
+    _async_connections_limit = 1000
+    _async_chunk_size = 64 * 1024
+    _async_sessions = weakref.WeakKeyDictionary()
+
     def __init__(self):
         pass
 
+    @staticmethod
+    def _create_session() -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Postman._pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        # Requests stay stateless like module-level requests calls: cookies are not saved between requests
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        return session
+
+    @staticmethod
+    def _evict_session(pooled_session: _PooledSession) -> None:
+        pooled_session.evicted = True
+        if pooled_session.number_users == 0:
+            pooled_session.session.close()
+
+    @staticmethod
+    def _evict_idle_sessions(now: float) -> None:
+        # Oldest sessions are first in LRU order: stop at the first session which is not idle
+        while len(Postman._sessions) > 0:
+            session_key, pooled_session = next(iter(Postman._sessions.items()))
+            if now - pooled_session.last_used < Postman._session_idle_time:
+                break
+            Postman._evict_session(Postman._sessions.pop(session_key))
+
+    @staticmethod
+    def _get_session(session_key) -> _PooledSession:
+        with Postman._sessions_lock:
+            now = time.monotonic()
+            Postman._evict_idle_sessions(now)
+
+            pooled_session = Postman._sessions.get(session_key)
+            if pooled_session is not None:
+                Postman._sessions.move_to_end(session_key)
+            else:
+                pooled_session = _PooledSession(session=Postman._create_session(), last_used=now)
+                if len(Postman._sessions) >= Postman._max_sessions:
+                    Postman._evict_session(Postman._sessions.popitem(last=False)[1])
+                Postman._sessions[session_key] = pooled_session
+            pooled_session.last_used = now
+            pooled_session.number_users += 1
+        return pooled_session
+
+    @staticmethod
+    def _release_session(pooled_session: _PooledSession) -> None:
+        with Postman._sessions_lock:
+            pooled_session.number_users -= 1
+            pooled_session.last_used = time.monotonic()
+            if pooled_session.evicted and pooled_session.number_users == 0:
+                pooled_session.session.close()
+
+    @staticmethod
+    def close_sessions() -> None:
+        with Postman._sessions_lock:
+            while len(Postman._sessions) > 0:
+                Postman._evict_session(Postman._sessions.popitem()[1])
+
+    @staticmethod
+    def _get_proxies(http_proxy: str = None, https_proxy: str = None):
+        if http_proxy is not None or https_proxy is not None:
+            return {
+                "http": "http://" + http_proxy if http_proxy is not None else "https://" + https_proxy,
+                "https": "https://" + https_proxy if https_proxy is not None else "http://" + http_proxy
+            }
+        return None
+
     @staticmethod
     def send_request(method: str,
                      url: str,
@@ -13,29 +125,97 @@ class Postman:
                      timeout: int = 20,
                      http_proxy: str = None,
                      https_proxy: str = None,
-                     status_code_check: int = None):
+                     status_code_check: int = None,
+                     data: bytes = None):
 
-        if http_proxy is not None or https_proxy is not None:
-            proxies = {
-                "http": "http://" + http_proxy if http_proxy is not None else "https://" + https_proxy,
-                "https": "https://" + https_proxy if https_proxy is not None else "http://" + http_proxy
-            }
-        else:
-            proxies = None
-
-        response = requests.request(
-            method=method,
-            url=url,
-            json=json,
-            headers=headers,
-            proxies=proxies,
-            timeout=timeout
-        )
+        proxies = Postman._get_proxies(http_proxy=http_proxy, https_proxy=https_proxy)
+
+        pooled_session = Postman._get_session((http_proxy, https_proxy))
+        try:
+            response = pooled_session.session.request(
+                method=method,
+                url=url,
+                json=json,
+                data=data,
+                headers=headers,
+                proxies=proxies,
+                timeout=timeout
+            )
+        finally:
+            Postman._release_session(pooled_session)
 
         if status_code_check is not None and response.status_code != status_code_check:
             raise Exception(f"URL {url} is not available: {response.status_code}\n")
         return response
 
+    @staticmethod
+    def _get_async_session() -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = Postman._async_sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=Postman._async_connections_limit)
+            session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+            Postman._async_sessions[loop] = session
+        return session
+
+    @staticmethod
+    async def async_close_sessions() -> None:
+        session = Postman._async_sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    @staticmethod
+    async def async_send_request(method: str,
+                                 url: str,
+                                 headers: dict = None,
+                                 json: dict = None,
+                                 timeout: int = 20,
+                                 http_proxy: str = None,
+                                 https_proxy: str = None,
+                                 status_code_check: int = None,
+                                 connect_timeout: float = None,
+                                 read_timeout: float = None,
+                                 max_response_size: int = None,
+                                 data: bytes = None) -> AsyncResponse:
+        # Same arguments than send_request: only one proxy URL is supported by aiohttp requests
+        proxies = Postman._get_proxies(http_proxy=http_proxy, https_proxy=https_proxy)
+        proxy = None if proxies is None else proxies["http"]
+
+        session = Postman._get_async_session()
+        client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout, sock_read=read_timeout)
+        async with session.request(method=method,
+                                   url=url,
+                                   json=json,
+                                   data=data,
+                                   headers=headers,
+                                   proxy=proxy,
+                                   timeout=client_timeout) as response:
+            if status_code_check is not None and response.status != status_code_check:
+                raise Exception(f"URL {url} is not available: {response.status}\n")
+
+            if max_response_size is not None and response.content_length is not None \
+                    and response.content_length > max_response_size:
+                raise Exception(f"URL {url} response is too large: {response.content_length} bytes\n")
+
+            # Body is read and decoded in chunks, stopped as soon as it is larger than the limit:
+            decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+            content_chunks = []
+            text_chunks = []
+            content_size = 0
+            async for chunk in response.content.iter_chunked(Postman._async_chunk_size):
+                content_size += len(chunk)
+                if max_response_size is not None and content_size > max_response_size:
+                    raise Exception(f"URL {url} response is too large: more than {max_response_size} bytes\n")
+                content_chunks.append(chunk)
+                text_chunks.append(decoder.decode(chunk))
+            text_chunks.append(decoder.decode(b"", final=True))
+
+            return AsyncResponse(url=url,
+                                 status_code=response.status,
+                                 headers=dict(response.headers),
+                                 content=b"".join(content_chunks),
+                                 text="".join(text_chunks))
+
 
 if __name__ == "__main__":
     postman_obj = Postman()
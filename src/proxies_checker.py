@@ -0,0 +1,91 @@
+"""
+proxies_checker.py module
+
+Asynchronous proxies checker: thousands of proxies are checked at the same time with separate connect and read
+timeouts. Checks are cancelled as soon as the requested number of available proxies is found, and the latency of each
+available proxy is returned.
+"""
+
+
+import asyncio
+import time
+
+from src.postman import Postman
+from src.logger import Logger
+from src.utils import FileOperations
+
+
+class AsyncProxiesChecker:
+    def __init__(self,
+                 check_url: str = "https://www.google.es/",
+                 connect_timeout: float = 3,
+                 read_timeout: float = 5,
+                 max_concurrent_checks: int = 500,
+                 max_response_size: int = 1024 * 1024,
+                 logger_level="INFO"):
+        self._check_url = check_url
+        self._connect_timeout = connect_timeout
+        self._read_timeout = read_timeout
+        self._max_concurrent_checks = max_concurrent_checks
+        self._max_response_size = max_response_size
+        self._logger_level = logger_level
+
+        # Set logger:
+        self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
+                              level=self._logger_level)
+
+    async def _check_proxy(self, semaphore: asyncio.Semaphore, proxy: str) -> tuple:
+        async with semaphore:
+            check_start_time = time.time()
+            try:
+                await Postman.async_send_request(method="GET",
+                                                 url=self._check_url,
+                                                 http_proxy=proxy,
+                                                 timeout=self._connect_timeout + self._read_timeout,
+                                                 connect_timeout=self._connect_timeout,
+                                                 read_timeout=self._read_timeout,
+                                                 max_response_size=self._max_response_size)
+            except Exception as exception:
+                self._logger.set_message(level="DEBUG",
+                                         message_level="MESSAGE",
+                                         message=f"Proxy: {proxy} is not available: {repr(exception)}\n")
+                return proxy, None
+            return proxy, time.time() - check_start_time
+
+    async def _check_proxies(self, proxies: list, max_available: int = None) -> dict:
+        proxies_latency = {proxy: None for proxy in proxies}
+        number_available = 0
+
+        semaphore = asyncio.Semaphore(self._max_concurrent_checks)
+        tasks = [asyncio.create_task(self._check_proxy(semaphore, proxy)) for proxy in set(proxies)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                proxy, latency = await task
+                if latency is not None:
+                    proxies_latency[proxy] = latency
+                    number_available += 1
+
+                    # Early cancellation: enough available proxies
+                    if max_available is not None and number_available >= max_available:
+                        break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await Postman.async_close_sessions()
+
+        self._logger.set_message(level="DEBUG",
+                                 message_level="MESSAGE",
+                                 message=f"Proxies checked: {number_available} available of {len(proxies)}")
+        return proxies_latency
+
+    def check_proxies(self, proxies: list, max_available: int = None) -> dict:
+        # Returns latency of available proxies and None for unavailable or not checked proxies:
+        if len(proxies) == 0:
+            return {}
+        return asyncio.run(self._check_proxies(proxies=proxies, max_available=max_available))
+
+
+if __name__ == "__main__":
+    proxies_checker_obj = AsyncProxiesChecker(logger_level="DEBUG")
+    print(proxies_checker_obj.check_proxies(["127.0.0.1:8080"]))
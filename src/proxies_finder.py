@@ -1,11 +1,12 @@
+import concurrent.futures
+
 from src.proxies_page import FreeProxyListPage
 from src.proxies_page import FreeProxyCzPage
 from src.proxies_page import GeonodePage
 from src.proxies_page import Common
 import pandas as pd
 import warnings
-from src.postman import Postman
-import dask.dataframe as dd
+from src.proxies_checker import AsyncProxiesChecker
 from src.logger import Logger
 from src.utils import ROOT_PATH
 from src.utils import FileOperations
@@ -28,9 +29,10 @@ class ProxiesFinder:
                  check_proxies: bool = True,
                  logger_level="INFO"):
 
-        self._check_timeout = 5
+        self._check_connect_timeout = 3
+        self._check_read_timeout = 5
         self._check_url = "https://www.google.es/"
-        self._max_number_threads = 10
+        self._max_concurrent_checks = 500
         self.freeProxyList_page = FreeProxyListPage()
         self.freeProxyCz_page = FreeProxyCzPage()
         self.geonode_page = GeonodePage()
@@ -53,18 +55,17 @@ class ProxiesFinder:
                               # logs_file_path=self.outputs_folder,
                               level=self._logger_level)
 
-    def _check_proxy(self, proxy):
-        try:
-            Postman.send_request(method="GET",
-                                 url=self._check_url,
-                                 http_proxy=proxy,
-                                 timeout=self._check_timeout)
-        except Exception as exception:
-            self._logger.set_message(level="DEBUG",
-                                     message_level="MESSAGE",
-                                     message=f"Proxy: {proxy} is not available: {str(exception)}\n")
-            return False
-        return True
+    def check_proxies_latency(self, proxies: pd.Series, max_available: int = None) -> pd.Series:
+        proxies_checker = AsyncProxiesChecker(check_url=self._check_url,
+                                              connect_timeout=self._check_connect_timeout,
+                                              read_timeout=self._check_read_timeout,
+                                              max_concurrent_checks=self._max_concurrent_checks,
+                                              logger_level=self._logger_level)
+        proxies_latency = proxies_checker.check_proxies(proxies.dropna().tolist(), max_available=max_available)
+        return proxies.map(proxies_latency)
+
+    def check_proxies_availability(self, proxies: pd.Series) -> pd.Series:
+        return self.check_proxies_latency(proxies).notnull()
 
     def _read_proxies_page(self, page, proxies_df):
         try:
@@ -85,9 +86,13 @@ class ProxiesFinder:
         # Initialize parameters:
         proxies_df = self.proxies_df.copy()
 
-        # Get proxies:
-        proxies_df = self._read_proxies_page("freeProxyList", proxies_df)
-        proxies_df = self._read_proxies_page("geonode", proxies_df)
+        # Get proxies: all pages are read at the same time
+        pages = ["freeProxyList", "geonode"]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(pages)) as executor:
+            pages_proxies_df = list(executor.map(lambda page: self._read_proxies_page(page, self.proxies_df.copy()),
+                                                 pages))
+        for page_proxies_df in pages_proxies_df:
+            proxies_df = Common.append_proxies_to_df(proxies_df, page_proxies_df.to_dict('records'))
 
         self._logger.set_message(level="DEBUG",
                                  message_level="MESSAGE",
@@ -108,20 +113,19 @@ class ProxiesFinder:
                                  message=f"Number of filtered unchecked proxies found: {str(len(proxies_df))}")
 
         if not proxies_df.empty:
-            # Apply max. size filter:
-            if self.max_size is not None:
-                proxies_df = proxies_df[:self.max_size]
-
-            # Remove unavailable proxies:
+            # Remove unavailable proxies: checks stop when max. size available proxies are found
             if self.check_proxies:
-                proxies_df["available"] = dd.from_pandas(proxies_df["proxy"], npartitions=self._max_number_threads) \
-                    .map_partitions(
-                    lambda dframe: dframe.apply(lambda row: self._check_proxy(proxy=row) if (pd.notnull(row)) else row)).compute(
-                    scheduler='threads')
-
+                proxies_df["latency"] = self.check_proxies_latency(proxies_df["proxy"], max_available=self.max_size)
+                proxies_df["available"] = proxies_df["latency"].notnull()
+                proxies_df = proxies_df.sort_values(by="latency")
             else:
                 proxies_df["available"] = None
 
+            # Apply max. size filter:
+            if self.max_size is not None:
+                proxies_df = proxies_df[(proxies_df["available"] == True) | (proxies_df["available"].isnull())]
+                proxies_df = proxies_df[:self.max_size]
+
             # Set proxies return variables:
             self.proxies_df = proxies_df[
                 (proxies_df["available"] == True) | (proxies_df["available"].isnull())
@@ -1,4 +1,6 @@
 import time
+import math
+import concurrent.futures
 
 from bs4 import BeautifulSoup
 import pandas as pd
@@ -36,7 +38,8 @@ class Common:
         "Last_Checked": str,
         "created_date": str,
         "created_user": "ordillan",
-        "available": True
+        "available": True,
+        "latency": None
     }
 
     @staticmethod
@@ -46,6 +49,20 @@ class Common:
         else:
             return False
 
+    @staticmethod
+    def append_proxies_to_df(data_df, proxies_models: list) -> pd.DataFrame:
+        # Duplicated proxies are skipped with a set and dataframe is built only once:
+        known_proxies = set(data_df['proxy'].values)
+        new_proxies_models = []
+        for proxy_model in proxies_models:
+            if proxy_model["proxy"] not in known_proxies:
+                known_proxies.add(proxy_model["proxy"])
+                new_proxies_models.append(proxy_model)
+
+        if len(new_proxies_models) == 0:
+            return data_df
+        return pd.concat([data_df, pd.DataFrame(new_proxies_models)], ignore_index=True)
+
     @staticmethod
     def type_converter(value, parameter_type):
         if parameter_type == "affirmation":
@@ -103,6 +120,8 @@ class FreeProxyListPage(Common):
         table = html_doc.find('section', id='list').findChildren('table')[0].findChildren('tbody')[0]
         table_rows = table.findChildren('tr')
 
+        created_date = datetime.now(TIMEZONE_MADRID)
+        proxies_models = []
         for table_row in table_rows:
             row_cells = table_row.findChildren('td')
             proxy_model = Common.PROXY_MODEL.copy()
@@ -110,22 +129,21 @@ class FreeProxyListPage(Common):
             for index_cell, row_cell in enumerate(row_cells):
                 proxy_model[self._proxy_table_indexes[index_cell]] = row_cell.text
             proxy_model["proxy"] = proxy_model["IP_Address"] + ":" + proxy_model["Port"]
-            proxy_model["created_date"] = datetime.now(TIMEZONE_MADRID)
+            proxy_model["created_date"] = created_date
             proxy_model["Anonymity"] = Common.type_converter(proxy_model["Anonymity"], parameter_type="Anonymity")
             proxy_model["Https"] = Common.type_converter(proxy_model["Https"], parameter_type="affirmation")
+            proxies_models.append(proxy_model)
 
-            # Save data on dataframe
-            if not Common.check_proxy_in_df(proxies_df, proxy_model["proxy"]):
-                proxy_model_df = pd.DataFrame([proxy_model])
-                proxies_df = pd.concat([proxies_df, proxy_model_df], ignore_index=True)
-        return proxies_df
+        # Save data on dataframe
+        return Common.append_proxies_to_df(proxies_df, proxies_models)
 
 
 class GeonodePage(Common):
     def __init__(self):
         # TODO: apply filters in request
-        self.url = "https://proxylist.geonode.com/api/proxy-list?limit=500&page=1&sort_by=lastChecked&sort_type=desc" \
-                   "&protocols=http%2Chttps&anonymityLevel=elite&anonymityLevel=anonymous"
+        self._page_size = 500
+        self._max_number_threads = 10
+        self.url = self._get_url(page=1)
         self._proxy_table_indexes = {
             "ip": "IP_Address",
             "port": "Port",
@@ -136,43 +154,60 @@ class GeonodePage(Common):
             "lastChecked": "Last_Checked"
         }
 
-    def _set_url(self, page: int):
-        self.url = f"https://proxylist.geonode.com/api/proxy-list?limit=500&page={page}&sort_by=lastChecked&sort_type" \
-               f"=desc&protocols=http%2Chttps&anonymityLevel=elite&anonymityLevel=anonymous"
-
-    def get_proxies(self, proxies_df: pd.DataFrame()) -> pd.DataFrame:
-        page = 1
-        number_proxies = 500
-        while number_proxies != 0:
-            # Get Free Proxy HTML:
-            self._set_url(page=page)
-            response = Postman.send_request(method='GET',
-                                            url=self.url,
-                                            status_code_check=200)
-            response_data = response.json()
-
-            # Iterate over proxies:
-            number_proxies = len(response_data["data"])
-            for proxy in response_data["data"]:
-                proxy_model = Common.PROXY_MODEL.copy()
+    def _get_url(self, page: int) -> str:
+        return f"https://proxylist.geonode.com/api/proxy-list?limit={self._page_size}&page={page}&sort_by=lastChecked" \
+               f"&sort_type=desc&protocols=http%2Chttps&anonymityLevel=elite&anonymityLevel=anonymous"
 
-                for key, value in proxy.items():
-                    if key in self._proxy_table_indexes.keys():
-                        proxy_model[self._proxy_table_indexes[key]] = value
-                proxy_model["proxy"] = proxy_model["IP_Address"] + ":" + proxy_model["Port"]
-                proxy_model["created_date"] = datetime.now(TIMEZONE_MADRID)
-                proxy_model["Anonymity"] = Common.type_converter(proxy_model["Anonymity"], parameter_type="Anonymity")
-                proxy_model["Https"] = Common.type_converter(proxy_model["Https"][0],
-                                                             parameter_type="Protocol")  # TODO: find element in list
-                proxy_model["Last_Checked"] = datetime.fromtimestamp(proxy_model["Last_Checked"])
+    def _get_page_data(self, page: int) -> dict:
+        response = Postman.send_request(method='GET',
+                                        url=self._get_url(page=page),
+                                        status_code_check=200)
+        return response.json()
+
+    def _get_proxy_model(self, proxy: dict, created_date: datetime) -> dict:
+        proxy_model = Common.PROXY_MODEL.copy()
+
+        for key, value in proxy.items():
+            if key in self._proxy_table_indexes.keys():
+                proxy_model[self._proxy_table_indexes[key]] = value
+        proxy_model["proxy"] = proxy_model["IP_Address"] + ":" + proxy_model["Port"]
+        proxy_model["created_date"] = created_date
+        proxy_model["Anonymity"] = Common.type_converter(proxy_model["Anonymity"], parameter_type="Anonymity")
+        proxy_model["Https"] = Common.type_converter(proxy_model["Https"][0],
+                                                     parameter_type="Protocol")  # TODO: find element in list
+        proxy_model["Last_Checked"] = datetime.fromtimestamp(proxy_model["Last_Checked"])
+        return proxy_model
 
-                # Save data on dataframe
-                if not Common.check_proxy_in_df(proxies_df, proxy_model["proxy"]):
-                    proxy_model_df = pd.DataFrame([proxy_model])
-                    proxies_df = pd.concat([proxies_df, proxy_model_df], ignore_index=True)
+    def get_proxies(self, proxies_df: pd.DataFrame() = None) -> pd.DataFrame:
+        if proxies_df is None:
+            proxies_df = pd.DataFrame(columns=list(self.PROXY_MODEL.keys()))
 
-            page += 1
-        return proxies_df
+        # First page returns the total number of proxies:
+        pages_data = [self._get_page_data(page=1)]
+        total_proxies = pages_data[0].get("total")
+
+        if total_proxies is not None:
+            # Read the rest of pages at the same time:
+            number_pages = math.ceil(total_proxies / self._page_size)
+            if number_pages > 1:
+                number_workers = min(self._max_number_threads, number_pages - 1)
+                with concurrent.futures.ThreadPoolExecutor(max_workers=number_workers) as executor:
+                    pages_data += list(executor.map(self._get_page_data, range(2, number_pages + 1)))
+        else:
+            # Unknown total: read pages until an empty one is returned
+            page = 1
+            while len(pages_data[-1]["data"]) != 0:
+                page += 1
+                pages_data.append(self._get_page_data(page=page))
+
+        # Iterate over proxies:
+        created_date = datetime.now(TIMEZONE_MADRID)
+        proxies_models = [self._get_proxy_model(proxy, created_date)
+                          for page_data in pages_data
+                          for proxy in page_data["data"]]
+
+        # Save data on dataframe
+        return Common.append_proxies_to_df(proxies_df, proxies_models)
 
 
 # TODO:
@@ -208,6 +243,7 @@ class FreeProxyCzPage(Common):
         table_rows_elements = table_element.find_elements(By.TAG_NAME, "tr")
 
         iteration = 0
+        proxies_models = []
         for table_rows_element in table_rows_elements:
             row_cells_elements = table_rows_element.find_elements(By.TAG_NAME, "td")
             if len(row_cells_elements) == 11:
@@ -222,16 +258,16 @@ class FreeProxyCzPage(Common):
                 proxy_model["created_date"] = datetime.now(TIMEZONE_MADRID)
                 proxy_model["Anonymity"] = Common.type_converter(proxy_model["Anonymity"], parameter_type="Anonymity")
                 proxy_model["Https"] = Common.type_converter(proxy_model["Protocol"], parameter_type="Protocol")
-
-                # Save data on dataframe
-                proxy_model_df = pd.DataFrame([proxy_model])
-                proxies_df = pd.concat([proxies_df, proxy_model_df], ignore_index=True)
+                proxies_models.append(proxy_model)
 
                 # Check iteration number:
                 iteration += 1
                 if iteration == max_size:
                     break
 
+        # Save data on dataframe
+        return Common.append_proxies_to_df(proxies_df, proxies_models)
+
     def _close_popup(self, driver):
         try:
             driver.find_element("xpath", "//*[text()='Close']").click()
@@ -0,0 +1,137 @@
+"""
+proxies_refresher.py module
+
+Background thread that keeps a proxies pool alive: it reads new proxies from the proxies pages (ProxiesFinder) on a
+schedule or when the pool is running out of proxies, and it revalidates the known proxies, so the web scrapers never stop
+to wait for a complete proxies reading.
+"""
+
+
+import threading
+import time
+from typing import Callable
+
+import pandas as pd
+
+from src.logger import Logger
+from src.utils import FileOperations
+from src.proxies_finder import ProxiesFinder
+from src.proxy_pool import ProxyPool
+
+
+class ProxiesRefresher:
+    def __init__(self,
+                 proxy_pool: ProxyPool,
+                 find_new_proxies: bool = True,
+                 anonymity_filter: list = None,
+                 refresh_interval: float = 300,
+                 revalidation_interval: float = 900,
+                 min_pool_size: int = 20,
+                 delete_proxy_function: Callable = None,
+                 update_function: Callable = None,
+                 logger_level="INFO"):
+        self._proxy_pool = proxy_pool
+        self._find_new_proxies = find_new_proxies
+        self._anonymity_filter = anonymity_filter
+        self._refresh_interval = refresh_interval
+        self._revalidation_interval = revalidation_interval
+        self._min_pool_size = min_pool_size
+        self._delete_proxy_function = proxy_pool.evict if delete_proxy_function is None else delete_proxy_function
+        self._update_function = update_function
+        self._logger_level = logger_level
+        self._check_pool_interval = 5
+        self._min_refresh_interval = 60
+
+        self._last_refresh_time = None
+        self._last_revalidation_time = time.monotonic()
+        self._refresh_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+        # Set logger:
+        self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
+                              level=self._logger_level)
+
+    def _get_proxies_finder(self, check_proxies: bool = True) -> ProxiesFinder:
+        return ProxiesFinder(anonymity_filter=self._anonymity_filter,
+                             check_proxies=check_proxies,
+                             logger_level=self._logger_level)
+
+    def _refresh(self) -> None:
+        proxies_finder = self._get_proxies_finder()
+        proxies_finder.get_proxies(find_new_proxies=self._find_new_proxies)
+
+        # Hot-swap: new proxies are available for the workers as soon as they are added:
+        number_added = self._proxy_pool.add_many(proxies_finder.proxies_list,
+                                                 data=proxies_finder.proxies_df.to_dict('records'))
+        self._logger.set_message(level="INFO",
+                                 message_level="MESSAGE",
+                                 message=f"Proxies refreshed: {number_added} new proxies, "
+                                         f"{len(self._proxy_pool)} available proxies")
+
+    def _revalidate(self) -> None:
+        proxies = self._proxy_pool.get_proxies()
+        if len(proxies) == 0:
+            return
+
+        proxies_finder = self._get_proxies_finder()
+        proxies_available = proxies_finder.check_proxies_availability(pd.Series(proxies))
+
+        number_unavailable = 0
+        for proxy, available in zip(proxies, proxies_available.tolist()):
+            if not available:
+                self._delete_proxy_function(proxy)
+                number_unavailable += 1
+        self._logger.set_message(level="INFO",
+                                 message_level="MESSAGE",
+                                 message=f"Proxies revalidated: {number_unavailable} unavailable proxies deleted, "
+                                         f"{len(self._proxy_pool)} available proxies")
+
+    def _is_refresh_needed(self) -> bool:
+        if self._last_refresh_time is None:
+            return True
+
+        # Proxies pages are not read again and again when they do not return enough proxies:
+        elapsed_time = time.monotonic() - self._last_refresh_time
+        if elapsed_time < self._min_refresh_interval:
+            return False
+        if self._refresh_event.is_set() or len(self._proxy_pool) < self._min_pool_size:
+            return True
+        return elapsed_time > self._refresh_interval
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                if self._is_refresh_needed():
+                    self._refresh_event.clear()
+                    self._last_refresh_time = time.monotonic()
+                    self._refresh()
+                if time.monotonic() - self._last_revalidation_time > self._revalidation_interval:
+                    self._last_revalidation_time = time.monotonic()
+                    self._revalidate()
+                if self._update_function is not None:
+                    self._update_function()
+            except Exception as exception:
+                self._logger.set_message(level="ERROR",
+                                         message_level="MESSAGE",
+                                         message=f"Proxies refresh failed: {str(exception)}")
+
+            # Sleep until next check, a refresh request or a stop request:
+            if self._refresh_event.is_set():
+                self._stop_event.wait(timeout=self._check_pool_interval)
+            else:
+                self._refresh_event.wait(timeout=self._check_pool_interval)
+
+    def start(self) -> None:
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="proxies_refresher", daemon=True)
+        self._thread.start()
+
+    def refresh_now(self) -> None:
+        self._refresh_event.set()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._refresh_event.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,181 @@
+"""
+proxy_pool.py module
+
+Thread-safe pool of proxies used by the web scrapers. Proxies are leased and given back with the result of the request,
+so each proxy keeps its own success rate and latency score. Leases are chosen with a weighted random selection over a
+small sample, and proxies are added and evicted in O(1) (no dataframe copies). Evicted proxies are not added again until
+their eviction time to live expires, so proxies refreshes do not bring back banned or failing proxies.
+"""
+
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ProxyStats:
+    proxy: str
+    data: dict = field(default_factory=dict)
+    index: int = 0
+    successes: int = 0
+    failures: int = 0
+    consecutive_bans: int = 0
+    latency: float = None
+    leases: int = 0
+
+    def get_success_rate(self) -> float:
+        # Laplace smoothing: new proxies start with a 0.5 success rate
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    def get_score(self, default_latency: float) -> float:
+        latency = default_latency if self.latency is None else self.latency
+        return self.get_success_rate() / max(latency, 0.01)
+
+
+class ProxyPool:
+    def __init__(self,
+                 selection_sample: int = 5,
+                 latency_smoothing: float = 0.3,
+                 default_latency: float = 5.0,
+                 evicted_time_to_live: float = 3600):
+        self._selection_sample = selection_sample
+        self._latency_smoothing = latency_smoothing
+        self._default_latency = default_latency
+        self._evicted_time_to_live = evicted_time_to_live
+
+        self._proxies = []
+        self._stats = {}
+        # Evicted proxies: proxy -> time they can be added again
+        self._evicted_proxies = {}
+        self._lock = threading.Lock()
+        self._proxies_available = threading.Condition(self._lock)
+
+    def __len__(self) -> int:
+        return len(self._proxies)
+
+    def __contains__(self, proxy: str) -> bool:
+        return proxy in self._stats
+
+    def _remove_expired_evictions(self, now: float) -> None:
+        for proxy in [proxy for proxy, expiry_time in self._evicted_proxies.items() if expiry_time <= now]:
+            self._evicted_proxies.pop(proxy)
+
+    def _add(self, proxy: str, data: dict = None) -> bool:
+        if proxy in self._evicted_proxies:
+            if self._evicted_proxies[proxy] > time.monotonic():
+                return False
+            self._evicted_proxies.pop(proxy)
+        if proxy in self._stats:
+            if data is not None:
+                self._stats[proxy].data = data
+            return False
+        data = {} if data is None else data
+
+        # Latency measured by proxies checker is the initial latency score:
+        latency = data.get("latency")
+        latency = latency if isinstance(latency, (int, float)) and latency == latency else None
+        self._stats[proxy] = ProxyStats(proxy=proxy, data=data, index=len(self._proxies), latency=latency)
+        self._proxies.append(proxy)
+        return True
+
+    def add(self, proxy: str, data: dict = None) -> bool:
+        with self._lock:
+            added = self._add(proxy, data)
+            self._proxies_available.notify_all()
+        return added
+
+    def add_many(self, proxies: list, data: list = None) -> int:
+        with self._lock:
+            self._remove_expired_evictions(time.monotonic())
+            number_added = 0
+            for index, proxy in enumerate(proxies):
+                number_added += self._add(proxy, None if data is None else data[index])
+            self._proxies_available.notify_all()
+        return number_added
+
+    def evict(self, proxy: str) -> bool:
+        with self._lock:
+            proxy_stats = self._stats.pop(proxy, None)
+            if proxy_stats is None:
+                # Already removed by another worker
+                return False
+            self._evicted_proxies[proxy] = time.monotonic() + self._evicted_time_to_live
+
+            # Swap with the last proxy and remove it from the end of the list:
+            last_proxy = self._proxies.pop()
+            if last_proxy != proxy:
+                self._proxies[proxy_stats.index] = last_proxy
+                self._stats[last_proxy].index = proxy_stats.index
+        return True
+
+    def lease(self, wait_time_function=None) -> str:
+        with self._lock:
+            if len(self._proxies) == 0:
+                return None
+
+            # Weighted selection over a random sample: better score, less leases and less waiting time are preferred
+            if len(self._proxies) <= self._selection_sample:
+                candidates = list(self._proxies)
+            else:
+                candidates = random.sample(self._proxies, self._selection_sample)
+            weights = []
+            for candidate in candidates:
+                proxy_stats = self._stats[candidate]
+                weight = proxy_stats.get_score(self._default_latency) / (1 + proxy_stats.leases)
+                if wait_time_function is not None:
+                    weight /= 1 + wait_time_function(candidate)
+                weights.append(weight)
+            proxy = random.choices(candidates, weights=weights)[0]
+
+            self._stats[proxy].leases += 1
+        return proxy
+
+    def give_back(self, proxy: str, success: bool, latency: float = None, banned: bool = False) -> int:
+        with self._lock:
+            proxy_stats = self._stats.get(proxy)
+            if proxy_stats is None:
+                return 0
+
+            proxy_stats.leases = max(0, proxy_stats.leases - 1)
+            if success:
+                proxy_stats.successes += 1
+                proxy_stats.consecutive_bans = 0
+            else:
+                proxy_stats.failures += 1
+            if banned:
+                proxy_stats.consecutive_bans += 1
+            if latency is not None:
+                if proxy_stats.latency is None:
+                    proxy_stats.latency = latency
+                else:
+                    proxy_stats.latency += self._latency_smoothing * (latency - proxy_stats.latency)
+            return proxy_stats.consecutive_bans
+
+    def wait_for_proxies(self, timeout: float = None) -> bool:
+        with self._proxies_available:
+            return self._proxies_available.wait_for(lambda: len(self._proxies) > 0, timeout=timeout)
+
+    def get_proxies(self) -> list:
+        with self._lock:
+            return list(self._proxies)
+
+    def get_data(self, proxy: str) -> dict:
+        with self._lock:
+            proxy_stats = self._stats.get(proxy)
+            return {} if proxy_stats is None else dict(proxy_stats.data)
+
+    def get_snapshot(self) -> list:
+        with self._lock:
+            return [{"proxy": proxy_stats.proxy, "data": dict(proxy_stats.data)} for proxy_stats in self._stats.values()]
+
+    def get_stats(self) -> list:
+        with self._lock:
+            return [{
+                "proxy": proxy_stats.proxy,
+                "successes": proxy_stats.successes,
+                "failures": proxy_stats.failures,
+                "latency": proxy_stats.latency,
+                "score": proxy_stats.get_score(self._default_latency)
+            } for proxy_stats in self._stats.values()]
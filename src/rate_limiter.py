@@ -0,0 +1,86 @@
+"""
+rate_limiter.py module
+
+Token bucket rate limiter per proxy. Each proxy has its own requests rate and can be frozen during a cool-down time
+(i.e. after a BOT detection), so the total requests rate grows with the number of proxies, not with the number of
+threads.
+"""
+
+
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self,
+                 rate: float,
+                 capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_time = time.monotonic()
+        self.cool_down_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+
+    def get_wait_time(self, now: float) -> float:
+        self._refill(now)
+        cool_down_time = max(0.0, self.cool_down_until - now)
+        token_time = max(0.0, (1 - self.tokens) / self.rate)
+        return max(cool_down_time, token_time)
+
+    def reserve(self, now: float) -> float:
+        # Token is taken in advance: tokens can be negative, so next callers wait for their own turn
+        wait_time = self.get_wait_time(now)
+        self.tokens -= 1
+        return wait_time
+
+
+class ProxiesRateLimiter:
+    def __init__(self,
+                 requests_per_second: float = 1 / 0.75,
+                 burst: float = 1,
+                 cool_down_time: float = 60):
+        self._requests_per_second = requests_per_second
+        self._burst = burst
+        self._cool_down_time = cool_down_time
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _get_bucket(self, proxy: str) -> TokenBucket:
+        bucket = self._buckets.get(proxy)
+        if bucket is None:
+            bucket = TokenBucket(rate=self._requests_per_second, capacity=self._burst)
+            self._buckets[proxy] = bucket
+        return bucket
+
+    def get_wait_time(self, proxy: str) -> float:
+        with self._lock:
+            return self._get_bucket(proxy).get_wait_time(time.monotonic())
+
+    def is_cooling_down(self, proxy: str) -> bool:
+        with self._lock:
+            bucket = self._buckets.get(proxy)
+            return bucket is not None and bucket.cool_down_until > time.monotonic()
+
+    def reserve(self, proxy: str) -> float:
+        with self._lock:
+            return self._get_bucket(proxy).reserve(time.monotonic())
+
+    def wait(self, proxy: str) -> float:
+        wait_time = self.reserve(proxy)
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+    def cool_down(self, proxy: str, cool_down_time: float = None) -> None:
+        cool_down_time = self._cool_down_time if cool_down_time is None else cool_down_time
+        with self._lock:
+            bucket = self._get_bucket(proxy)
+            bucket.cool_down_until = max(bucket.cool_down_until, time.monotonic() + cool_down_time)
+
+    def remove(self, proxy: str) -> None:
+        with self._lock:
+            self._buckets.pop(proxy, None)
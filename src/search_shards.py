@@ -0,0 +1,183 @@
+"""
+search_shards.py module
+
+Search space planner: the complete catalogue is split by provinces and price, year and km bands into shards that can be
+crawled independently (other proxies, other processes). Each shard is probed with its total results, shards with too many
+results are split again and small shards of the same bands are merged, so every shard pagination stays shallow.
+"""
+
+
+import copy
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable
+
+from src.logger import Logger
+from src.utils import FileOperations
+
+
+@dataclass
+class SearchShard:
+    filters: dict = field(default_factory=dict)
+    total_results: int = None
+
+    def get_name(self) -> str:
+        filters_text = json.dumps(self.filters, sort_keys=True)
+        return "shard_" + hashlib.md5(filters_text.encode("utf-8")).hexdigest()[:12]
+
+    def get_bands_key(self) -> str:
+        # Filters without provinces: shards with the same bands can be merged
+        filters = {key: value for key, value in self.filters.items() if key != "provinceIds"}
+        return json.dumps(filters, sort_keys=True)
+
+
+class SearchShardPlanner:
+    PROVINCE_IDS = list(range(1, 53))
+
+    # Split order and bounds of the range filters:
+    RANGE_FILTERS = {
+        "price": (0, 500000),
+        "year": (1950, datetime.now().year),
+        "km": (0, 1000000)
+    }
+
+    def __init__(self,
+                 count_function: Callable,
+                 max_shard_results: int = 5000,
+                 province_ids: list = None,
+                 range_filters: dict = None,
+                 logger_level="INFO"):
+        self._count_function = count_function
+        self._max_shard_results = max_shard_results
+        self._province_ids = self.PROVINCE_IDS if province_ids is None else province_ids
+        self._range_filters = self.RANGE_FILTERS if range_filters is None else range_filters
+        self._logger_level = logger_level
+        self._number_probes = 0
+
+        # Set logger:
+        self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
+                              level=self._logger_level)
+
+    def _count(self, shard: SearchShard) -> SearchShard:
+        shard.total_results = self._count_function(shard.filters)
+        self._number_probes += 1
+        return shard
+
+    @staticmethod
+    def _is_empty_range(range_from: int, range_to: int) -> bool:
+        # Range filters values are not negative:
+        if range_to is not None and range_to < 0:
+            return True
+        return range_from is not None and range_to is not None and range_to < range_from
+
+    def _is_empty(self, shard: SearchShard) -> bool:
+        return any(self._is_empty_range(shard.filters.get(filter_name, {}).get("from"),
+                                        shard.filters.get(filter_name, {}).get("to"))
+                   for filter_name in self._range_filters)
+
+    @staticmethod
+    def _split_range(range_from: int, range_to: int, low: int, high: int):
+        # Values are not negative: an open range from zero is the same range
+        if range_from is None and low <= 0:
+            range_from = low
+
+        # Open ranges are closed first with the filter bounds, then closed ranges are split in halves.
+        # A side beyond its bound can not be split: next filter is used
+        if range_from is None:
+            if range_to is not None and range_to < low:
+                return None
+            return [(None, low - 1), (low, range_to)]
+        if range_to is None:
+            if range_from > high:
+                return None
+            return [(range_from, high), (high + 1, None)]
+        if range_to <= range_from:
+            return None
+        middle = (range_from + range_to) // 2
+        return [(range_from, middle), (middle + 1, range_to)]
+
+    def _split(self, shard: SearchShard) -> list:
+        for filter_name, (low, high) in self._range_filters.items():
+            filter_range = shard.filters.get(filter_name, {})
+            ranges = self._split_range(filter_range.get("from"), filter_range.get("to"), low, high)
+            if ranges is None:
+                continue
+
+            shards = []
+            for range_from, range_to in ranges:
+                if self._is_empty_range(range_from, range_to):
+                    continue
+                filters = copy.deepcopy(shard.filters)
+                filters[filter_name] = {"from": range_from, "to": range_to}
+                shards.append(SearchShard(filters=filters))
+            return shards
+        return []
+
+    def _merge(self, shards: list) -> list:
+        # First fit decreasing: provinces of the same bands are packed until the maximum shard results
+        shards_by_bands = {}
+        for shard in shards:
+            shards_by_bands.setdefault(shard.get_bands_key(), []).append(shard)
+
+        merged_shards = []
+        for bands_shards in shards_by_bands.values():
+            packed_shards = []
+            for shard in sorted(bands_shards, key=lambda item: item.total_results, reverse=True):
+                for packed_shard in packed_shards:
+                    if packed_shard.total_results + shard.total_results <= self._max_shard_results:
+                        packed_shard.filters["provinceIds"] += shard.filters["provinceIds"]
+                        packed_shard.total_results += shard.total_results
+                        break
+                else:
+                    packed_shards.append(SearchShard(filters=copy.deepcopy(shard.filters),
+                                                     total_results=shard.total_results))
+            merged_shards += packed_shards
+        return merged_shards
+
+    def plan(self, base_filters: dict = None) -> list:
+        self._logger.set_message(level="INFO",
+                                 message_level="SUBSECTION",
+                                 message="Plan search shards")
+        self._number_probes = 0
+        base_filters = {} if base_filters is None else base_filters
+
+        pending_shards = [SearchShard(filters={**copy.deepcopy(base_filters), "provinceIds": [province_id]})
+                          for province_id in self._province_ids]
+        shards = []
+        while len(pending_shards) > 0:
+            shard = pending_shards.pop()
+            if self._is_empty(shard):
+                continue
+            shard = self._count(shard)
+            if shard.total_results is None:
+                # Shard is not lost when it can not be probed: it is crawled without splitting
+                self._logger.set_message(level="ERROR",
+                                         message_level="MESSAGE",
+                                         message=f"Search shard {shard.filters} total results not available")
+                shard.total_results = self._max_shard_results
+            if shard.total_results == 0:
+                continue
+
+            # Rebalance: too big shards are split while there is any range filter to split
+            if shard.total_results > self._max_shard_results:
+                split_shards = self._split(shard)
+                if len(split_shards) > 0:
+                    pending_shards += split_shards
+                    continue
+            shards.append(shard)
+
+        shards = self._merge(shards)
+        shards.sort(key=lambda item: item.total_results, reverse=True)
+        self._logger.set_message(level="INFO",
+                                 message_level="MESSAGE",
+                                 message=f"Search shards: {len(shards)} shards, "
+                                         f"{sum(shard.total_results for shard in shards)} results, "
+                                         f"{self._number_probes} probes")
+        return shards
+
+
+if __name__ == "__main__":
+    search_shard_planner = SearchShardPlanner(count_function=lambda filters: 1000, logger_level="DEBUG")
+    print(search_shard_planner.plan())
@@ -0,0 +1,372 @@
+"""
+web_scraper_async.py module
+
+Asyncio alternative to web_scraper_v3. Instead of a new set of threads per search page, every detail request is a task
+of a single event loop, so the number of requests in flight is only limited by the concurrency limit and the proxies pool,
+not by the number of OS threads.
+"""
+
+
+import asyncio
+import concurrent.futures
+import json
+import time
+from datetime import datetime
+import zoneinfo
+import random
+import os
+
+from src.postman import Postman
+from src.logger import Logger
+from src.utils import FileOperations
+from src.utils import ROOT_PATH
+from src.utils import JSONFileOperations
+from src.cochesNet_api import CochesNetAPI
+from src.data_extractor import DataExtractor
+from src.cache import Cache
+from src.cache_server import CacheClient
+from src.rate_limiter import ProxiesRateLimiter
+from src.concurrency_controller import ConcurrencyController
+from src.concurrency_controller import AsyncConcurrencyLimiter
+from src.proxy_pool import ProxyPool
+from src.proxies_refresher import ProxiesRefresher
+from src.search_shards import SearchShard
+
+TIMEZONE_MADRID = zoneinfo.ZoneInfo("Europe/Madrid")
+
+random.seed(datetime.now().timestamp())
+
+
+class AsyncWebScraper:
+    BOT_DETECTION_MESSAGE = "Algo en tu navegador nos hizo pensar que eres un bot"
+    LOCATION_DETECTION_MESSAGE = "You don't have permission to access /vpns/ on this server."
+
+    def __init__(self,
+                 execution_time: int = None,
+                 start_page: int = None,
+                 end_page: int = None,
+                 find_new_proxies: bool = True,
+                 max_concurrent_requests: int = 1000,
+                 search_shard: SearchShard = None,
+                 outputs_folder: str = None,
+                 compact_cache: bool = False,
+                 cache_snapshot_directory: str = None,
+                 cache_refresh_interval: float = None,
+                 cache_socket_file: str = None,
+                 logger_level="INFO"):
+        self._execution_time = execution_time
+        self.start_page = start_page
+        self.end_page = end_page
+        self._find_new_proxies = find_new_proxies
+        self._search_shard = search_shard
+        self._search_filters = None if search_shard is None else search_shard.filters
+        self._proxy_pool = ProxyPool()
+        self._proxies_refresher = ProxiesRefresher(proxy_pool=self._proxy_pool,
+                                                   find_new_proxies=find_new_proxies,
+                                                   anonymity_filter=[1, 2],
+                                                   delete_proxy_function=self._delete_proxy,
+                                                   logger_level=logger_level)
+        self.outputs_folder = ROOT_PATH + "/outputs/" + str(int(datetime.now().timestamp())) \
+            if outputs_folder is None else outputs_folder
+        if search_shard is not None:
+            # Shards crawled at the same time write their pages on different folders:
+            self.outputs_folder += "/" + search_shard.get_name()
+        self._logger_level = logger_level
+        self._scrapping_wait_time = 0.75
+        self._bot_cool_down_time = 60
+        self._max_bot_detections = 3
+        self._proxies_sleep_time = 300
+        self._number_api_retries = 10
+        self._request_timeout = 20
+        self._max_response_size = 10 * 1024 * 1024
+        self._max_concurrent_requests = max_concurrent_requests
+        self._exit = False
+        self._rate_limiter = ProxiesRateLimiter(requests_per_second=1 / self._scrapping_wait_time,
+                                                cool_down_time=self._bot_cool_down_time)
+        self._concurrency_controller = ConcurrencyController(initial_limit=min(100, max_concurrent_requests),
+                                                             max_limit=max_concurrent_requests,
+                                                             additive_increase=10)
+        self._requests_limiter = AsyncConcurrencyLimiter(self._concurrency_controller)
+        self._proxies_lock = None
+        self._pages_tasks = []
+        self._pending_details = 0
+
+        # Ingestion runs in a single thread: the data extractor object is shared by all the pages:
+        self._ingestion_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+        # Set web to scrap:
+        self._page_api = CochesNetAPI()
+
+        # Set data extractor object: one for the whole run, sharing the same cache than search pages
+        if cache_socket_file is not None:
+            self._cache = CacheClient(socket_file=cache_socket_file, logger_level=logger_level)
+        else:
+            self._cache = Cache(logger_level='INFO',
+                                compact=compact_cache,
+                                snapshot_directory=cache_snapshot_directory,
+                                refresh_interval=cache_refresh_interval)
+        self._data_extractor_obj = DataExtractor(cache_obj=self._cache, logger_level='INFO')
+
+        # Timing:
+        self.start_time = time.time()
+
+        # Set logger:
+        self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
+                              logs_file_path=self.outputs_folder,
+                              level=self._logger_level)
+
+    async def _get_proxies(self):
+        # Proxies are read continuously by the proxies refresher: only ask for a refresh and wait for it
+        self._proxies_refresher.refresh_now()
+        async with self._proxies_lock:
+            if len(self._proxy_pool) > 0:
+                return
+            proxies_available = await asyncio.to_thread(self._proxy_pool.wait_for_proxies,
+                                                        timeout=self._proxies_sleep_time)
+            if not proxies_available:
+                self._logger.set_message(level="INFO",
+                                         message_level="MESSAGE",
+                                         message=f"There is any proxy available after {self._proxies_sleep_time} "
+                                                 f"seconds")
+
+    def _get_elapsed_time(self) -> float:
+        # Check execution time:
+        current_time = time.time()
+        return current_time - self.start_time
+
+    def _check_elapsed_time(self):
+        if self._execution_time is not None:
+            elapsed_time = self._get_elapsed_time()
+            if elapsed_time > self._execution_time:
+                self._logger.set_message(level="INFO",
+                                         message_level="MESSAGE",
+                                         message=f"Finished iterating in: {str(int(elapsed_time))} seconds: "
+                                                 f"TIME ending")
+                return True
+        return False
+
+    def _delete_proxy(self, proxy: str) -> None:
+        # Another task could have already removed the proxy:
+        if self._proxy_pool.evict(proxy):
+            self._rate_limiter.remove(proxy)
+
+    async def _send_request(self, request_params: dict, proxy: str) -> str:
+        response = await Postman.async_send_request(
+            method=request_params.get("method"),
+            url=request_params.get("url"),
+            headers=request_params.get("headers"),
+            json=request_params.get("json"),
+            data=request_params.get("data"),
+            http_proxy=proxy,
+            timeout=self._request_timeout,
+            status_code_check=200,
+            max_response_size=self._max_response_size
+        )
+        return response.text
+
+    async def _get_url_content(self, request_params: dict, url_reference=""):
+        response_content = None
+        iteration = 0
+        while iteration < self._number_api_retries:
+            # Review proxies availability in iteration:
+            proxy = self._proxy_pool.lease(wait_time_function=self._rate_limiter.get_wait_time)
+            if proxy is None:
+                await self._get_proxies()
+                continue
+
+            request_start_time = time.time()
+            try:
+                # Wait for proxy turn before taking a request slot:
+                await asyncio.sleep(self._rate_limiter.reserve(proxy))
+                async with self._requests_limiter:
+                    request_start_time = time.time()
+                    response_text = await self._send_request(request_params=request_params, proxy=proxy)
+                request_time = time.time() - request_start_time
+
+                if self.BOT_DETECTION_MESSAGE in response_text:
+                    self._logger.set_message(level="DEBUG",
+                                             message_level="MESSAGE",
+                                             message=f"Response HTTP Response Body: KO - forbidden: {url_reference} BOT detection"
+                                                     f" - PROXY:\n{proxy}")
+                    self._concurrency_controller.record(latency=request_time, success=False, banned=True)
+
+                    # Freeze proxy IP during cool down time, remove it if it is detected again and again:
+                    bot_detections = self._proxy_pool.give_back(proxy, success=False, latency=request_time, banned=True)
+                    if bot_detections >= self._max_bot_detections:
+                        self._delete_proxy(proxy)
+                    else:
+                        self._rate_limiter.cool_down(proxy)
+                    iteration += 1
+                elif self.LOCATION_DETECTION_MESSAGE in response_text:
+                    self._logger.set_message(level="DEBUG",
+                                             message_level="MESSAGE",
+                                             message=f"Response HTTP Response Body: KO - forbidden: {url_reference} LOCATION detection"
+                                                     f" - PROXY:\n{proxy}")
+                    self._concurrency_controller.record(latency=request_time, success=False)
+                    self._proxy_pool.give_back(proxy, success=False, latency=request_time)
+                    self._delete_proxy(proxy)
+                    iteration += 1
+                else:
+                    response_content = json.loads(response_text)
+                    self._concurrency_controller.record(latency=request_time, success=True)
+                    self._proxy_pool.give_back(proxy, success=True, latency=request_time)
+                    self._logger.set_message(level="DEBUG",
+                                             message_level="MESSAGE",
+                                             message=f"Response HTTP Response Body: OK - {url_reference}"
+                                                     f" - PROXY:\n{proxy}")
+                    break
+            except Exception as exception:
+                self._logger.set_message(level="DEBUG",
+                                         message_level="MESSAGE",
+                                         message=f"Response HTTP Response Body: KO - failed: {url_reference}\n{str(exception)}\n"
+                                                 f" - PROXY:\n{proxy}")
+                self._concurrency_controller.record(latency=time.time() - request_start_time, success=False)
+                self._proxy_pool.give_back(proxy, success=False)
+
+                # Remove not valid proxies:
+                self._delete_proxy(proxy)
+                iteration += 1
+
+        return response_content
+
+    async def _get_detail_data(self, announcement: dict, current_page: int) -> bool:
+        announcement_id = self._page_api.get_announcement_id(announcement)
+
+        self._logger.set_message(level="DEBUG",
+                                 message_level="COMMENT",
+                                 message=f"Page {current_page}: read announcement detail {announcement_id}\n"
+                                         f"PID: {os.getpid()}")
+
+        request_params = self._page_api.get_request_announcement(announcement=announcement)
+        try:
+            detail_response = await self._get_url_content(request_params=request_params,
+                                                          url_reference=announcement_id)
+        finally:
+            self._pending_details -= 1
+        if detail_response is None:
+            self._logger.set_message(level="ERROR",
+                                     message_level="MESSAGE",
+                                     message=f"Page {current_page}: announcement detail {announcement_id} ERROR.")
+            return False
+
+        self._save_detail_results(page=current_page, detail=announcement_id, result=detail_response)
+        return True
+
+    async def _process_page(self,
+                            announcements: list,
+                            current_page: int,
+                            pre_page_scrap_time: float):
+        # All page details are requested at the same time, the semaphore limits the requests in flight:
+        results = await asyncio.gather(*[self._get_detail_data(announcement=announcement,
+                                                               current_page=current_page)
+                                         for announcement in announcements])
+        details_scrap_time = time.time() - pre_page_scrap_time
+
+        # Save results on database:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._ingestion_executor,
+                                   self._data_extractor_obj.run,
+                                   self.outputs_folder + f"/page_{str(current_page)}")
+
+        # Log timing stats:
+        self._logger.set_message(level="INFO",
+                                 message_level="COMMENT",
+                                 message=f"Page {current_page}: timing statistics:"
+                                         f"\n\tTotal announcements: {sum(results)}"
+                                         f"\n\tComplete page scrapping (seconds): {time.time() - pre_page_scrap_time}"
+                                         f"\n\tOnly page details scrapping (seconds): {details_scrap_time}"
+                                         f"\n\tConcurrency limit: {self._concurrency_controller.limit}")
+
+    async def _run(self):
+        self._proxies_lock = asyncio.Lock()
+
+        # Initialize proxies: they are refreshed in background during the whole run
+        self._proxies_refresher.start()
+        await self._get_proxies()
+
+        # Initialize page:
+        current_page = self.start_page if self.start_page is not None else 0
+
+        while not self._exit:
+            # Do not read more search pages than details that can be requested at the same time:
+            self._pages_tasks = [page_task for page_task in self._pages_tasks if not page_task.done()]
+            if self._pending_details >= self._max_concurrent_requests:
+                await asyncio.wait(self._pages_tasks, return_when=asyncio.FIRST_COMPLETED)
+                continue
+
+            # Get url page content:
+            self._logger.set_message(level="INFO",
+                                     message_level="SUBSECTION",
+                                     message=f"Read page {current_page} content")
+            pre_page_scrap_time = time.time()
+            request_params = self._page_api.get_request_search_by_date_desc(page=current_page,
+                                                                            filters=self._search_filters)
+            search_response = await self._get_url_content(request_params=request_params)
+
+            if search_response is not None and len(self._page_api.get_announcements(search_response)) == 0:
+                # Empty page: there are no more announcements to read
+                self._logger.set_message(level="INFO",
+                                         message_level="MESSAGE",
+                                         message=f"Finished iterating: page {current_page} is empty: EMPTY ending")
+                self._exit = True
+            elif search_response is not None:
+                # Convert and save results:
+                self._save_page_results(page=current_page, result=search_response)
+
+                # Read ID per announcement:
+                announcements = self._data_extractor_obj.process_search_data(search_response)
+                self._logger.set_message(level="INFO",
+                                         message_level="COMMENT",
+                                         message=f"Page {current_page}: announcements to read: "
+                                                 f"{len(announcements)}")
+
+                # Extract details data in background:
+                self._pending_details += len(announcements)
+                self._pages_tasks.append(asyncio.create_task(
+                    self._process_page(announcements=announcements,
+                                       current_page=current_page,
+                                       pre_page_scrap_time=pre_page_scrap_time)))
+
+                current_page += 1
+
+            # Finish iterations is elapsed time is greater than maximum execution time:
+            if self._check_elapsed_time():
+                self._exit = True
+            # Check page finish:
+            if self.end_page is not None:
+                if current_page > self.end_page:
+                    self._logger.set_message(level="INFO",
+                                             message_level="MESSAGE",
+                                             message="Finished iterating: PAGE ending")
+                    self._exit = True
+            if search_response is not None:
+                if current_page >= self._page_api.get_number_pages(search_response):
+                    self._exit = True
+
+        # Wait for pages in progress:
+        if len(self._pages_tasks) > 0:
+            await asyncio.gather(*self._pages_tasks)
+
+        await Postman.async_close_sessions()
+        self._ingestion_executor.shutdown(wait=True)
+        self._proxies_refresher.stop()
+        self._cache.stop_refresh()
+
+    def run(self):
+        self._logger.set_message(level="INFO",
+                                 message_level="SECTION",
+                                 message="Start Async Web Scraper")
+        asyncio.run(self._run())
+
+    def _save_page_results(self, page: int, result) -> None:
+        JSONFileOperations.write_file(self.outputs_folder + f"/page_{str(page)}.json",
+                                      result)
+
+    def _save_detail_results(self, page: int, detail: int, result) -> None:
+        JSONFileOperations.write_file(self.outputs_folder + f"/page_{str(page)}/detail_{str(detail)}.json",
+                                      result)
+
+
+if __name__ == "__main__":
+    web_scraper = AsyncWebScraper(start_page=0, end_page=3000, find_new_proxies=False, logger_level='INFO')
+    web_scraper.run()
@@ -327,7 +327,7 @@ class WebScraper:
                                              message="Finished iterating: PAGE ending")
                     self._exit = True
             if search_response is not None:
-                if current_page > self._page_api.get_number_pages(search_response):
+                if current_page >= self._page_api.get_number_pages(search_response):
                     self._exit = True
 
         # Save stats results:
@@ -345,6 +345,7 @@ class WebScraper:
             url=_get_param("url"),
             headers=_get_param("headers"),
             json=_get_param("json"),
+            data=_get_param("data"),
             http_proxy=proxy,
             timeout=20,
             status_code_check=200
@@ -1,3 +1,5 @@
+import collections
+import concurrent.futures
 import threading
 import queue
 import time
@@ -12,10 +14,21 @@ from src.logger import Logger
 from src.utils import FileOperations
 from src.utils import ROOT_PATH
 from src.utils import JSONFileOperations
-from src.proxies_finder import ProxiesFinder
 from src.postman import Postman
 from src.cochesNet_api import CochesNetAPI
 from src.data_extractor import DataExtractor
+from src.cache import Cache
+from src.cache_server import CacheClient
+from src.cache_server import CacheServer
+from src.worker_pool import WorkerPool
+from src.rate_limiter import ProxiesRateLimiter
+from src.concurrency_controller import ConcurrencyController
+from src.proxy_pool import ProxyPool
+from src.proxies_refresher import ProxiesRefresher
+from src.search_shards import SearchShard
+from src.search_shards import SearchShardPlanner
+from src.checkpoint import CrawlCheckpoint
+from src.bloom_filter import SeenAnnouncementsFilter
 from src.adapters.repository import SqlAlchemyRepository as Repository
 
 TIMEZONE_MADRID = zoneinfo.ZoneInfo("Europe/Madrid")
@@ -29,29 +42,114 @@ class WebScraper:
                  start_page: int = None,
                  end_page: int = None,
                  find_new_proxies: bool = True,
+                 search_shard: SearchShard = None,
+                 outputs_folder: str = None,
+                 incremental: bool = False,
+                 resume: bool = True,
+                 seen_announcements_file: str = None,
+                 compact_cache: bool = False,
+                 cache_snapshot_directory: str = None,
+                 cache_refresh_interval: float = None,
+                 cache_socket_file: str = None,
                  logger_level="INFO"):
         self._execution_time = execution_time
         self.start_page = start_page
         self.end_page = end_page
         self._find_new_proxies = find_new_proxies
-        self.proxies = []
-        self._proxies_df = pd.DataFrame
-        self.outputs_folder = ROOT_PATH + "/outputs/" + str(int(datetime.now().timestamp()))
+        self._search_shard = search_shard
+        self._search_filters = None if search_shard is None else search_shard.filters
+        self._incremental = incremental
+        self._proxy_pool = ProxyPool()
+        self._proxies_refresher = ProxiesRefresher(proxy_pool=self._proxy_pool,
+                                                   find_new_proxies=find_new_proxies,
+                                                   anonymity_filter=[1, 2],
+                                                   delete_proxy_function=self._delete_proxy,
+                                                   update_function=self._resize_detail_workers,
+                                                   logger_level=logger_level)
+        self.outputs_folder = ROOT_PATH + "/outputs/" + str(int(datetime.now().timestamp())) \
+            if outputs_folder is None else outputs_folder
+        if search_shard is not None:
+            # Shards crawled at the same time write their pages on different folders:
+            self.outputs_folder += "/" + search_shard.get_name()
+
+        # Crawl checkpoint: a stopped run is resumed on the same outputs folder and from the same page
+        self._checkpoint = CrawlCheckpoint(checkpoint_file=ROOT_PATH + "/outputs/checkpoints/" +
+                                           ("catalogue" if search_shard is None else search_shard.get_name()) + ".json",
+                                           proxies_function=self._proxy_pool.get_snapshot,
+                                           logger_level=logger_level)
+        self._sort_term = CochesNetAPI.SORT_TERM_PUBLICATION_DATE if incremental else None
+        self._resumed = resume and self._checkpoint.load(search_filters=self._search_filters, sort_term=self._sort_term)
+        if self._resumed:
+            self.outputs_folder = self._checkpoint.outputs_folder
+            self.start_page = self._checkpoint.next_page
+        self._time_ending = False
         self._logger_level = logger_level
-        self._proxies_wait_time = 0.25
         self._scrapping_wait_time = 0.75
+        self._bot_cool_down_time = 60
+        self._max_bot_detections = 3
         self._proxies_sleep_time = 300
         self._number_api_retries = 10
-        self._max_number_threads = 5
+        self._initial_number_requests = 5
+        self._max_number_threads = 50
+        self._detail_queue_size = 500
+        self._search_prefetch_pages = 3
+        self._page_plan = None
+        self._number_pages = None
         self._exit = False
-        self._proxies_finder = False
-        self._page_scrapped_details = 0
+
+        # Requests rate per proxy: one request each scrapping wait time, frozen after BOT detections:
+        self._rate_limiter = ProxiesRateLimiter(requests_per_second=1 / self._scrapping_wait_time,
+                                                cool_down_time=self._bot_cool_down_time)
+
+        # Requests in flight: adapted to latency, errors and BOT detections:
+        self._concurrency_controller = ConcurrencyController(initial_limit=self._initial_number_requests,
+                                                             max_limit=self._max_number_threads)
+
+        # Pipeline stages: search -> details -> ingestion:
+        self._search_queue = queue.Queue(maxsize=self._search_prefetch_pages)
+        self._detail_pool = WorkerPool(target=self._get_detail_data,
+                                       max_queue_size=self._detail_queue_size,
+                                       max_workers=self._max_number_threads,
+                                       name="detail",
+                                       logger_level=self._logger_level)
+        self._ingestion_queue = queue.Queue()
+
+        # Pages in progress: pending details, scrapped details and timing:
+        self._pages_lock = threading.Lock()
+        self._pages_pending_details = {}
+        self._pages_scrapped_details = {}
+        self._pages_start_time = {}
+        self._pages_search_time = {}
 
         # Set web to scrap:
         self._page_api = CochesNetAPI()
 
-        # Set data extractor object:
-        self._data_extractor_obj = DataExtractor(logger_level='INFO')
+        # Incremental mode: newest announcements first, only until the last run high-water mark
+        self._high_water_mark_file = ROOT_PATH + "/outputs/high_water_marks/" + \
+            ("catalogue" if search_shard is None else search_shard.get_name()) + ".json"
+        self._high_water_mark = self._read_high_water_mark() if incremental else None
+        self._last_publication_date = self._high_water_mark
+        self._incremental_completed = False
+        self._failed_pages = set()
+
+        # Set known announcements filter: shared bloom filter file or run cache
+        if seen_announcements_file is not None:
+            self._seen_announcements_filter = SeenAnnouncementsFilter(bloom_filter_file=seen_announcements_file,
+                                                                      logger_level=logger_level)
+            self._cache = None
+        elif cache_socket_file is not None:
+            # Cache of the cache server: shared by all the processes of the host
+            self._seen_announcements_filter = None
+            self._cache = CacheClient(socket_file=cache_socket_file, logger_level=logger_level)
+        else:
+            self._seen_announcements_filter = None
+            self._cache = Cache(logger_level='INFO',
+                                compact=compact_cache,
+                                snapshot_directory=cache_snapshot_directory,
+                                refresh_interval=cache_refresh_interval)
+
+        # Set data extractor object: one for the whole run, sharing the same cache than search pages
+        self._data_extractor_obj = DataExtractor(cache_obj=self._cache, logger_level='INFO')
 
         # Timing:
         self.start_time = time.time()
@@ -64,6 +162,7 @@ class WebScraper:
             "anonymity": bool,
             "https": bool,
             "available_proxies": int,
+            "concurrency_limit": int,
             "iteration_timestamp": str,
             "status_code": int,
             "result": str,
@@ -78,28 +177,49 @@ class WebScraper:
                               level=self._logger_level)
 
     def _get_proxies(self):
-        # TODO: implement continuous proxies reading
-        # TODO: lock proxies when they are used
-        if not self._proxies_finder:
-            self._proxies_finder = True
-
-            # proxies_finder = ProxiesFinder(anonymity_filter=[1, 2],
-            #                                codes_filter=["US", "DE", "FR", "ES", "UK"])
-            proxies_finder = ProxiesFinder(anonymity_filter=[1, 2])
-            proxies_finder.get_proxies(find_new_proxies=self._find_new_proxies)
-            self.proxies = proxies_finder.proxies_list
-            self._proxies_df = proxies_finder.proxies_df
-            self._proxies_finder = False
-        else:
-            while not self._proxies_finder:
-                time.sleep(self._proxies_wait_time)
-
-        number_proxies = len(self.proxies)
-        if number_proxies == 0:
+        # Proxies are read continuously by the proxies refresher: only ask for a refresh and wait for it
+        self._proxies_refresher.refresh_now()
+        if not self._proxy_pool.wait_for_proxies(timeout=self._proxies_sleep_time):
             self._logger.set_message(level="INFO",
                                      message_level="MESSAGE",
-                                     message=f"There is any proxy available. Sleep 10 minutes-")
-            time.sleep(self._proxies_sleep_time)
+                                     message=f"There is any proxy available after {self._proxies_sleep_time} seconds")
+
+        self._resize_detail_workers()
+
+    def _read_high_water_mark(self):
+        if not os.path.isfile(self._high_water_mark_file):
+            return None
+        high_water_mark = JSONFileOperations.read_file(self._high_water_mark_file)
+        return datetime.fromisoformat(high_water_mark["publication_date"])
+
+    def _save_high_water_mark(self) -> None:
+        if self._last_publication_date is None:
+            return
+        JSONFileOperations.write_file(self._high_water_mark_file,
+                                      {"publication_date": self._last_publication_date.isoformat(),
+                                       "filters": self._search_filters,
+                                       "created_date": datetime.now(TIMEZONE_MADRID).isoformat()})
+
+    def _is_page_known(self, search_response: dict, announcements: list) -> bool:
+        publication_dates = [self._page_api.get_announcement_publication_date(announcement)
+                             for announcement in self._page_api.get_announcements(search_response)]
+        valid_publication_dates = [publication_date for publication_date in publication_dates
+                                   if publication_date is not None]
+        if len(valid_publication_dates) > 0:
+            page_publication_date = max(valid_publication_dates)
+            if self._last_publication_date is None or page_publication_date > self._last_publication_date:
+                self._last_publication_date = page_publication_date
+
+        # Known page: every announcement is in cache or older than the last run high-water mark
+        if len(announcements) == 0:
+            return True
+        if self._high_water_mark is None or len(valid_publication_dates) < len(publication_dates):
+            return False
+        return all(publication_date < self._high_water_mark for publication_date in valid_publication_dates)
+
+    def _resize_detail_workers(self) -> None:
+        # One detail worker per available proxy:
+        self._detail_pool.resize(len(self._proxy_pool))
 
     def _get_elapsed_time(self) -> float:
         # Check execution time:
@@ -108,18 +228,20 @@ class WebScraper:
 
     def _set_results_info(self,
                           page,
-                          proxy_index,
+                          proxy,
                           status_code,
                           result):
         # TODO:
         stats_model = self._stats_model.copy()
 
         stats_model["page"] = page
-        stats_model["proxy"] = self._proxies_df.iloc[proxy_index]["proxy"]
-        stats_model["country"] = self._proxies_df.iloc[proxy_index]["Country"]
-        stats_model["anonymity"] = self._proxies_df.iloc[proxy_index]["Anonymity"]
-        stats_model["https"] = self._proxies_df.iloc[proxy_index]["Https"]
-        stats_model["available_proxies"] = len(self.proxies)
+        proxy_data = self._proxy_pool.get_data(proxy)
+        stats_model["proxy"] = proxy
+        stats_model["country"] = proxy_data.get("Country")
+        stats_model["anonymity"] = proxy_data.get("Anonymity")
+        stats_model["https"] = proxy_data.get("Https")
+        stats_model["available_proxies"] = len(self._proxy_pool)
+        stats_model["concurrency_limit"] = self._concurrency_controller.limit
         stats_model["iteration_timestamp"] = self._get_elapsed_time()
         stats_model["status_code"] = status_code
         stats_model["result"] = result
@@ -130,59 +252,74 @@ class WebScraper:
         _stats_df = pd.DataFrame([stats_model])
         self._stats_df = pd.concat([self._stats_df, _stats_df], ignore_index=True)
 
-    def _get_proxy_index(self, proxy_value: str) -> int:
-        return self.proxies.index(proxy_value)
-
-    def _delete_proxies(self, proxy_indexes: list = None, proxy: str = None) -> None:
-        if proxy is not None:
-            proxy_indexes = [self._get_proxy_index(proxy)]
-        if proxy_indexes is not None:
-            self._proxies_df = self._proxies_df.drop(index=proxy_indexes).reset_index(drop=True)
-            self.proxies = self._proxies_df["proxy"].tolist()
+    def _delete_proxy(self, proxy: str) -> None:
+        # Only the first worker that evicts the proxy updates the rest of objects:
+        if self._proxy_pool.evict(proxy):
+            self._rate_limiter.remove(proxy)
+            self._resize_detail_workers()
 
     def _get_url_content(self, request_params: dict, url_reference: int = ""):
         response_content = None
         iteration = 0
         while iteration < self._number_api_retries:
             # Review proxies availability in iteration:
-            number_proxies = len(self.proxies)
-            if number_proxies == 0:
+            if len(self._proxy_pool) == 0:
                 self._get_proxies()
-            proxy = random.choice(self.proxies)
+            proxy = self._proxy_pool.lease(wait_time_function=self._rate_limiter.get_wait_time)
+            if proxy is None:
+                continue
 
+            self._rate_limiter.wait(proxy)
+            self._concurrency_controller.acquire()
+            request_start_time = time.time()
             try:
-                time.sleep(self._scrapping_wait_time)
-                response_content = self._send_request(request_params=request_params, proxy=proxy)
+                try:
+                    response_content = self._send_request(request_params=request_params, proxy=proxy)
+                finally:
+                    self._concurrency_controller.release()
+                request_time = time.time() - request_start_time
 
                 if "Algo en tu navegador nos hizo pensar que eres un bot" in response_content:
                     self._logger.set_message(level="DEBUG",
                                              message_level="MESSAGE",
                                              message=f"Response HTTP Response Body: KO - forbidden: {url_reference} BOT detection"
                                                      f" - PROXY:\n{proxy}")
-                    self._delete_proxies(proxy=proxy)
+                    self._concurrency_controller.record(latency=request_time, success=False, banned=True)
+
+                    # Freeze proxy IP during cool down time, remove it if it is detected again and again:
+                    bot_detections = self._proxy_pool.give_back(proxy, success=False, latency=request_time, banned=True)
+                    if bot_detections >= self._max_bot_detections:
+                        self._delete_proxy(proxy)
+                    else:
+                        self._rate_limiter.cool_down(proxy)
                     iteration += 1
                 elif "You don't have permission to access /vpns/ on this server." in response_content:
                     self._logger.set_message(level="DEBUG",
                                              message_level="MESSAGE",
                                              message=f"Response HTTP Response Body: KO - forbidden: {url_reference} LOCATION detection"
                                                      f" - PROXY:\n{proxy}")
-                    self._delete_proxies(proxy=proxy)
+                    self._concurrency_controller.record(latency=request_time, success=False)
+                    self._proxy_pool.give_back(proxy, success=False, latency=request_time)
+                    self._delete_proxy(proxy)
                     iteration += 1
                 else:
                     self._logger.set_message(level="DEBUG",
                                              message_level="MESSAGE",
                                              message=f"Response HTTP Response Body: OK - {url_reference}"
                                                      f" - PROXY:\n{proxy}")
-                    # time.sleep(30)    # TODO: freeze proxy IP during certain time - SLEEP
-                    # _set_proxy_to_delete(proxy)     # TODO: freeze proxy IP during certain time - REMOVE to avoid BOT
+                    self._concurrency_controller.record(latency=request_time, success=True)
+                    self._proxy_pool.give_back(proxy, success=True, latency=request_time)
                     break
             except Exception as exception:
                 self._logger.set_message(level="DEBUG",
                                          message_level="MESSAGE",
                                          message=f"Response HTTP Response Body: KO - failed: {url_reference}\n{str(exception)}\n"
                                                  f" - PROXY:\n{proxy}")
+                self._concurrency_controller.record(latency=time.time() - request_start_time, success=False)
+                self._proxy_pool.give_back(proxy, success=False)
+
                 # Remove not valid proxies:
-                self._delete_proxies(proxy=proxy)
+                self._delete_proxy(proxy)
                 iteration += 1
 
         return response_content
@@ -198,136 +335,283 @@ class WebScraper:
                 return True
         return False
 
-    def _get_detail_data(self, index_worker: int, queue_obj: queue, current_page: int):
-        while not queue_obj.empty():
-            announcement = queue_obj.get()
-            announcement_id = self._page_api.get_announcement_id(announcement)
-
-            self._logger.set_message(level="DEBUG",
-                                     message_level="COMMENT",
-                                     message=f"Page {current_page}: read announcement detail {announcement_id}\n"
-                                             f"Worker: {index_worker}, "
-                                             f"PID: {os.getpid()}, "
-                                             f"TID: {threading.get_ident()}")
-
-            request_params = self._page_api.get_request_announcement(announcement=announcement)
-            try:
-                detail_response = self._get_url_content(request_params=request_params, url_reference=announcement_id)
-                self._page_scrapped_details += 1
-            except Exception as exception:
-                self._logger.set_message(level="ERROR",
-                                         message_level="MESSAGE",
-                                         message=f"Page {current_page}: announcement detail {announcement_id} ERROR.\n"
-                                                 f"{str(exception)}")
-                queue_obj.put(announcement)  # Add again to queue
-                detail_response = None
-
-            if detail_response is not None:
-                self._save_detail_results(page=current_page, detail=announcement_id, result=detail_response)
-            queue_obj.task_done()
+    def _set_detail_done(self, current_page: int, announcement_id, scrapped: bool) -> None:
+        self._checkpoint.set_detail_done(page=current_page, announcement_id=announcement_id)
+        with self._pages_lock:
+            self._pages_pending_details[current_page] -= 1
+            if scrapped:
+                self._pages_scrapped_details[current_page] += 1
+            else:
+                self._failed_pages.add(current_page)
+            page_finished = self._pages_pending_details[current_page] == 0
+
+        # Last detail of the page: send it to database ingestion:
+        if page_finished:
+            self._ingestion_queue.put(current_page)
+
+    def _get_detail_data(self, index_worker: int, detail_item: tuple):
+        current_page, announcement = detail_item
+        announcement_id = self._page_api.get_announcement_id(announcement)
+
+        self._logger.set_message(level="DEBUG",
+                                 message_level="COMMENT",
+                                 message=f"Page {current_page}: read announcement detail {announcement_id}\n"
+                                         f"Worker: {index_worker}, "
+                                         f"PID: {os.getpid()}, "
+                                         f"TID: {threading.get_ident()}")
+
+        # Exceptions are handled by the workers pool: announcement is added again to queue
+        request_params = self._page_api.get_request_announcement(announcement=announcement)
+        detail_response = self._get_url_content(request_params=request_params, url_reference=announcement_id)
+
+        if detail_response is not None:
+            self._save_detail_results(page=current_page, detail=announcement_id, result=detail_response)
+        self._set_detail_done(current_page=current_page,
+                              announcement_id=announcement_id,
+                              scrapped=detail_response is not None)
         return True
 
-    def run(self):
-        self._logger.set_message(level="INFO",
-                                 message_level="SECTION",
-                                 message="Start Web Scraper")
-
-        # Initialize proxies:
-        self._get_proxies()
+    def _get_new_announcements(self, search_response: dict) -> list:
+        if self._seen_announcements_filter is None:
+            return self._data_extractor_obj.process_search_data(search_response)
 
-        # Initialize page:
-        pre_page_scrap_time = time.time()
-        current_page = self.start_page if self.start_page is not None else 0
+        announcements = [self._page_api.get_announcement_summary(announcement)
+                         for announcement in self._page_api.get_announcements(search_response)]
+        return self._seen_announcements_filter.get_new_announcements(announcer=self._page_api.page_name,
+                                                                     announcements=announcements)
 
+    def _get_search_page(self, current_page: int) -> tuple:
+        # Get url page content:
+        self._logger.set_message(level="INFO",
+                                 message_level="SUBSECTION",
+                                 message=f"Read page {current_page} content")
+        pre_search_scrap_time = time.time()
+        request_params = self._page_api.get_request_search_by_date_desc(page=current_page,
+                                                                        filters=self._search_filters,
+                                                                        sort_term=self._sort_term)
+        search_response = self._get_url_content(request_params=request_params)
+        return current_page, search_response, pre_search_scrap_time
+
+    def _set_page_plan(self, search_response: dict, first_page: int) -> None:
+        self._page_plan = self._page_api.get_page_plan(search_response, start_page=first_page, end_page=self.end_page)
+        self._number_pages = self._page_api.get_number_pages(search_response)
+        self._logger.set_message(level="INFO",
+                                 message_level="MESSAGE",
+                                 message=f"Page plan: {len(self._page_plan)} pages, from page {first_page} to page "
+                                         f"{self._page_plan.stop - 1} "
+                                         f"({self._page_api.get_number_results(search_response)} results)")
+
+    def _search_data(self):
+        # Initialize page: page plan is known after the first search page
+        first_page = self.start_page if self.start_page is not None else 0
+        next_page = first_page
+        pending_pages = collections.deque()
+
+        search_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self._search_prefetch_pages)
         while not self._exit:
-            # Finish iterations is elapsed time is greater than maximum execution time:
-            if self._exit:
+            # Planned pages are read ahead by search workers, and consumed in page order:
+            while len(pending_pages) < self._search_prefetch_pages and \
+                    (next_page in self._page_plan if self._page_plan is not None else len(pending_pages) == 0):
+                pending_pages.append(search_executor.submit(self._get_search_page, next_page))
+                next_page += 1
+            if len(pending_pages) == 0:
+                self._logger.set_message(level="INFO",
+                                         message_level="MESSAGE",
+                                         message="Finished iterating: PAGE ending")
+                # Incremental run is only completed when the plan reaches the last page, not the end page:
+                self._incremental_completed = self._incremental and self._page_plan.stop >= self._number_pages
                 break
 
-            # Get url page content:
-            self._logger.set_message(level="INFO",
-                                     message_level="SUBSECTION",
-                                     message=f"Read page {current_page} content")
-            pre_search_scrap_time = time.time()
-            request_params = self._page_api.get_request_search_by_date_desc(page=current_page)
-            search_response = self._get_url_content(request_params=request_params)
+            # Backpressure: do not read new search pages while details workers are saturated:
+            self._detail_pool.wait_for_capacity()
+            current_page, search_response, pre_search_scrap_time = pending_pages.popleft().result()
+
+            if search_response is None:
+                # Failed page is read again before the next ones:
+                pending_pages.appendleft(search_executor.submit(self._get_search_page, current_page))
+            elif len(self._page_api.get_announcements(search_response)) == 0:
+                # Empty page: there are no more announcements to read
+                self._logger.set_message(level="INFO",
+                                         message_level="MESSAGE",
+                                         message=f"Finished iterating: page {current_page} is empty: EMPTY ending")
+                self._incremental_completed = self._incremental
+                self._exit = True
+            else:
+                if self._page_plan is None:
+                    self._set_page_plan(search_response, first_page)
 
-            if search_response is not None:
                 # Convert and save results:
                 self._save_page_results(page=current_page, result=search_response)
 
-                # Create the queue of work
-                queue_obj = queue.Queue()
-
                 # Read ID per announcement:
-                announcements = self._data_extractor_obj.process_search_data(search_response)
-                [queue_obj.put(announcement) for announcement in announcements]
-
-                # Select number workers:
-                # num_available_cpus = multiprocessing.cpu_count() - 1
-                num_available_cpus = self._max_number_threads
-                if len(self.proxies) < num_available_cpus:
-                    number_workers = len(self.proxies)
-                else:
-                    number_workers = num_available_cpus
-
-                queue_size = queue_obj.qsize()
-                if queue_size < number_workers:
-                    number_workers = queue_size
+                announcements = self._get_new_announcements(search_response)
 
                 # Log timing: search page:
                 search_scrap_time = time.time() - pre_search_scrap_time
 
-                # Extract details data:
-                self._logger.set_message(level="INFO",
-                                         message_level="COMMENT",
-                                         message=f"Page {current_page}: announcements to read: {queue_size}")
-                pre_details_scrap_time = time.time()
-                self._page_scrapped_details = 0
-                for index in range(number_workers):
-                    threading.Thread(target=self._get_detail_data,
-                                     args=(index, queue_obj, current_page),
-                                     daemon=True).start()
-                queue_obj.join()
-
-                # Log timing: detail pages:
-                details_scrap_time = time.time() - pre_details_scrap_time
-
-                # Save results on database:
-                # TODO: refactor: run method can have specific outputs folder. Remove object declaration. Cache must be recalled in each rum
-                data_extractor_obj = DataExtractor(files_directory=self.outputs_folder + f"/page_{str(current_page)}",
-                                                   logger_level='INFO')
-                data_extractor_obj.run()
-
-                # Increment page number:
-                page_scrap_time = time.time() - pre_page_scrap_time
-                pre_page_scrap_time = time.time()
-
-                # Log timing stats:
-                self._logger.set_message(level="INFO",
-                                         message_level="COMMENT",
-                                         message=f"Page {current_page}: timing statistics:"
-                                                 f"\n\tTotal announcements: {self._page_scrapped_details}"
-                                                 f"\n\tComplete page scrapping (seconds): {page_scrap_time}"
-                                                 f"\n\tOnly page details scrapping (seconds): {details_scrap_time}"
-                                                 f"\n\tOnly search page details scrapping (seconds): {search_scrap_time}")
+                # Pending details are saved before they are dispatched:
+                self._checkpoint.set_page_started(page=current_page,
+                                                  announcements=announcements,
+                                                  announcement_id_function=self._page_api.get_announcement_id)
 
-                current_page += 1
+                # Blocks while prefetched pages queue is full:
+                self._search_queue.put((current_page, announcements, pre_search_scrap_time, search_scrap_time))
 
-            # Finish iterations is elapsed time is greater than maximum execution time:
-            if self._check_elapsed_time():
-                self._exit = True
-            # Check page finish:
-            if self.end_page is not None:
-                if current_page > self.end_page:
+                # Incremental mode: stop as soon as a page has no new announcements
+                if self._incremental and self._is_page_known(search_response, announcements):
                     self._logger.set_message(level="INFO",
                                              message_level="MESSAGE",
-                                             message="Finished iterating: PAGE ending")
-                    self._exit = True
-            if search_response is not None:
-                if current_page > self._page_api.get_number_pages(search_response):
+                                             message=f"Finished iterating: page {current_page} only has known "
+                                                     f"announcements: INCREMENTAL ending")
+                    self._incremental_completed = True
                     self._exit = True
 
+            # Finish iterations is elapsed time is greater than maximum execution time:
+            if self._check_elapsed_time():
+                self._time_ending = True
+                self._exit = True
+
+        # Pages read ahead are not needed anymore:
+        for pending_page in pending_pages:
+            pending_page.cancel()
+        search_executor.shutdown(wait=True)
+
+        # No more search pages:
+        self._search_queue.put(None)
+        return True
+
+    def _ingest_data(self):
+        while True:
+            current_page = self._ingestion_queue.get()
+            if current_page is None:
+                break
+
+            # Log timing: detail pages:
+            with self._pages_lock:
+                pre_page_scrap_time = self._pages_start_time.pop(current_page)
+                search_scrap_time = self._pages_search_time.pop(current_page)
+                page_scrapped_details = self._pages_scrapped_details.pop(current_page)
+                self._pages_pending_details.pop(current_page)
+            details_scrap_time = time.time() - pre_page_scrap_time - search_scrap_time
+
+            # Save results on database:
+            try:
+                self._data_extractor_obj.run(files_directory=self.outputs_folder + f"/page_{str(current_page)}")
+                self._checkpoint.set_page_completed(page=current_page)
+            except Exception as exception:
+                self._logger.set_message(level="ERROR",
+                                         message_level="MESSAGE",
+                                         message=f"Page {current_page}: data extraction ERROR.\n{str(exception)}")
+
+            page_scrap_time = time.time() - pre_page_scrap_time
+
+            # Log timing stats:
+            self._logger.set_message(level="INFO",
+                                     message_level="COMMENT",
+                                     message=f"Page {current_page}: timing statistics:"
+                                             f"\n\tTotal announcements: {page_scrapped_details}"
+                                             f"\n\tComplete page scrapping (seconds): {page_scrap_time}"
+                                             f"\n\tOnly page details scrapping (seconds): {details_scrap_time}"
+                                             f"\n\tOnly search page details scrapping (seconds): {search_scrap_time}"
+                                             f"\n\tConcurrency limit: {self._concurrency_controller.limit}")
+        return True
+
+    def _count_search_results(self, filters: dict):
+        request_params = self._page_api.get_request_search_by_date_desc(page=0, filters=filters)
+        search_response = self._get_url_content(request_params=request_params)
+        if search_response is None:
+            return None
+        return self._page_api.get_number_results(search_response)
+
+    def plan_search_shards(self, max_shard_results: int = 5000, base_filters: dict = None) -> list:
+        self._proxies_refresher.start()
+        self._get_proxies()
+        try:
+            search_shard_planner = SearchShardPlanner(count_function=self._count_search_results,
+                                                      max_shard_results=max_shard_results,
+                                                      logger_level=self._logger_level)
+            return search_shard_planner.plan(base_filters=base_filters)
+        finally:
+            self._proxies_refresher.stop()
+
+    def _dispatch_page(self,
+                       current_page: int,
+                       announcements: list,
+                       pre_page_scrap_time: float,
+                       search_scrap_time: float) -> None:
+        self._logger.set_message(level="INFO",
+                                 message_level="COMMENT",
+                                 message=f"Page {current_page}: announcements to read: {len(announcements)}")
+
+        with self._pages_lock:
+            self._pages_pending_details[current_page] = len(announcements)
+            self._pages_scrapped_details[current_page] = 0
+            self._pages_start_time[current_page] = pre_page_scrap_time
+            self._pages_search_time[current_page] = search_scrap_time
+
+        if len(announcements) == 0:
+            self._ingestion_queue.put(current_page)
+        for announcement in announcements:
+            self._detail_pool.put((current_page, announcement))
+
+    def run(self):
+        self._logger.set_message(level="INFO",
+                                 message_level="SECTION",
+                                 message=f"Start Web Scraper"
+                                         f"{'' if self._search_shard is None else ': ' + self._search_shard.get_name()}")
+
+        # Resume: proxies of the stopped run are available before the first proxies refresh
+        if self._resumed:
+            proxies = self._checkpoint.get_proxies()
+            self._proxy_pool.add_many([proxy["proxy"] for proxy in proxies], data=[proxy["data"] for proxy in proxies])
+        self._checkpoint.start(outputs_folder=self.outputs_folder,
+                               search_filters=self._search_filters,
+                               sort_term=self._sort_term,
+                               next_page=self.start_page if self.start_page is not None else 0)
+
+        # Initialize proxies: they are refreshed in background during the whole run
+        self._proxies_refresher.start()
+        self._get_proxies()
+
+        # Start pipeline stages: details workers live during the whole run, not only one page:
+        self._detail_pool.start(number_workers=len(self._proxy_pool))
+        ingestion_worker = threading.Thread(target=self._ingest_data, daemon=True)
+        ingestion_worker.start()
+
+        # Resume: pending details of the stopped run are dispatched before new search pages
+        if self._resumed:
+            for current_page, announcements in self._checkpoint.get_pending_details().items():
+                self._dispatch_page(current_page, announcements, time.time(), 0.0)
+
+        search_worker = threading.Thread(target=self._search_data, daemon=True)
+        search_worker.start()
+
+        # Dispatch prefetched search pages announcements to details workers:
+        while True:
+            search_item = self._search_queue.get()
+            if search_item is None:
+                break
+            self._dispatch_page(*search_item)
+
+        # Wait for pending details and database ingestion:
+        self._detail_pool.join()
+        self._detail_pool.stop()
+        self._ingestion_queue.put(None)
+        ingestion_worker.join()
+        self._proxies_refresher.stop()
+        if self._cache is not None:
+            self._cache.stop_refresh()
+
+        # High-water mark is only moved when all new announcements have been read, without failed pages:
+        if self._incremental_completed and not self._time_ending and len(self._failed_pages) == 0:
+            self._save_high_water_mark()
+
+        # Checkpoint is kept when the run is stopped by execution time: next run goes on from the same page
+        if self._time_ending:
+            self._checkpoint.save(force=True)
+        else:
+            self._checkpoint.remove()
+
         # Save stats results:
         # TODO: DataframeOperations.save_csv(self.outputs_folder + f"/log_results_stats.csv", self._stats_df)
 
@@ -343,6 +627,7 @@ class WebScraper:
             url=_get_param("url"),
             headers=_get_param("headers"),
             json=_get_param("json"),
+            data=_get_param("data"),
             http_proxy=proxy,
             timeout=20,
             status_code_check=200
@@ -358,6 +643,38 @@ class WebScraper:
                                       result)
 
 
+def _run_search_shard(search_shard: SearchShard, web_scraper_kwargs: dict) -> str:
+    web_scraper = WebScraper(search_shard=search_shard, **web_scraper_kwargs)
+    web_scraper.run()
+    return web_scraper.outputs_folder
+
+
+def run_search_shards(search_shards: list, number_processes: int = 4, **web_scraper_kwargs) -> list:
+    # Each shard runs in its own process, with its own proxies pool, on the same outputs folder:
+    web_scraper_kwargs.setdefault("outputs_folder", ROOT_PATH + "/outputs/" + str(int(datetime.now().timestamp())))
+
+    # Seen announcements filter is built once and memory-mapped by all the shards processes:
+    if web_scraper_kwargs.get("seen_announcements_file") is not None:
+        SeenAnnouncementsFilter(bloom_filter_file=web_scraper_kwargs["seen_announcements_file"]).build()
+
+    # Cache server: one cache for all the shards processes, instead of a cache copy each
+    cache_server = None
+    if web_scraper_kwargs.get("cache_socket_file") is not None:
+        cache_server = CacheServer(socket_file=web_scraper_kwargs["cache_socket_file"],
+                                   compact=web_scraper_kwargs.get("compact_cache", False),
+                                   snapshot_directory=web_scraper_kwargs.get("cache_snapshot_directory"),
+                                   refresh_interval=web_scraper_kwargs.get("cache_refresh_interval"))
+        cache_server.start()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=number_processes) as executor:
+            futures = [executor.submit(_run_search_shard, search_shard, web_scraper_kwargs)
+                       for search_shard in search_shards]
+            return [future.result() for future in futures]
+    finally:
+        if cache_server is not None:
+            cache_server.stop()
+
+
 if __name__ == "__main__":
     # web_scraper = WebScraper(execution_time=7200, start_page=0, logger_level='DEBUG')
     web_scraper = WebScraper(start_page=0, end_page=3000, find_new_proxies=False, logger_level='INFO')
@@ -0,0 +1,155 @@
+"""
+worker_pool.py module
+
+Long-lived pool of worker threads fed by a work queue with a bounded number of pending items. Producers are blocked
+(backpressure) when the pool is full, and the number of workers can be resized during the run, so the same threads are
+used across all search pages.
+"""
+
+
+import threading
+import queue
+from typing import Callable
+
+from src.logger import Logger
+from src.utils import FileOperations
+
+
+class WorkerPool:
+    def __init__(self,
+                 target: Callable,
+                 max_queue_size: int = 500,
+                 min_workers: int = 1,
+                 max_workers: int = 50,
+                 low_watermark: float = 0.5,
+                 name: str = "worker",
+                 logger_level="INFO"):
+        self._target = target
+        self._max_queue_size = max_queue_size
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self._low_watermark = int(max_queue_size * low_watermark)
+        self._name = name
+        self._logger_level = logger_level
+        self._get_timeout = 0.5
+
+        # Retried items do not take a new slot, so workers never block while putting items:
+        self._queue = queue.Queue()
+        self._slots = threading.BoundedSemaphore(max_queue_size)
+        self._pending_items = 0
+        self._pending_condition = threading.Condition()
+
+        self._workers_lock = threading.Lock()
+        self._workers = {}
+        self._workers_to_stop = 0
+        self._next_worker_index = 0
+        self._stop = False
+
+        # Set logger:
+        self._logger = Logger(module=FileOperations.get_file_name(__file__, False),
+                              level=self._logger_level)
+
+    @property
+    def number_workers(self) -> int:
+        with self._workers_lock:
+            return len(self._workers) - self._workers_to_stop
+
+    @property
+    def pending_items(self) -> int:
+        with self._pending_condition:
+            return self._pending_items
+
+    def is_saturated(self) -> bool:
+        return self.pending_items >= self._max_queue_size
+
+    def _start_worker(self) -> None:
+        index_worker = self._next_worker_index
+        self._next_worker_index += 1
+        worker = threading.Thread(target=self._work,
+                                  args=(index_worker,),
+                                  name=f"{self._name}_{index_worker}",
+                                  daemon=True)
+        self._workers[index_worker] = worker
+        worker.start()
+
+    def _check_worker_stop(self, index_worker: int) -> bool:
+        with self._workers_lock:
+            if self._stop or self._workers_to_stop > 0:
+                if not self._stop:
+                    self._workers_to_stop -= 1
+                self._workers.pop(index_worker, None)
+                return True
+        return False
+
+    def _set_item_done(self) -> None:
+        self._slots.release()
+        with self._pending_condition:
+            self._pending_items -= 1
+            self._pending_condition.notify_all()
+
+    def _work(self, index_worker: int) -> None:
+        while not self._check_worker_stop(index_worker):
+            try:
+                item = self._queue.get(timeout=self._get_timeout)
+            except queue.Empty:
+                continue
+
+            try:
+                self._target(index_worker, item)
+                self._set_item_done()
+            except Exception as exception:
+                self._logger.set_message(level="ERROR",
+                                         message_level="MESSAGE",
+                                         message=f"Worker {self._name}_{index_worker}: item failed, added again to "
+                                                 f"queue.\n{str(exception)}")
+                self._queue.put(item)
+
+    def start(self, number_workers: int = None) -> None:
+        self.resize(self.min_workers if number_workers is None else number_workers)
+
+    def resize(self, number_workers: int) -> int:
+        number_workers = max(self.min_workers, min(self.max_workers, number_workers))
+        with self._workers_lock:
+            current_workers = len(self._workers) - self._workers_to_stop
+            if number_workers > current_workers:
+                # Cancel pending stops before starting new threads:
+                restarted_workers = min(self._workers_to_stop, number_workers - current_workers)
+                self._workers_to_stop -= restarted_workers
+                for _ in range(number_workers - current_workers - restarted_workers):
+                    self._start_worker()
+            elif number_workers < current_workers:
+                # Workers stop themselves after their current item:
+                self._workers_to_stop += current_workers - number_workers
+
+        if number_workers != current_workers:
+            self._logger.set_message(level="DEBUG",
+                                     message_level="MESSAGE",
+                                     message=f"Pool {self._name}: workers resized from {current_workers} to "
+                                             f"{number_workers}")
+        return number_workers
+
+    def put(self, item, block: bool = True, timeout: float = None) -> bool:
+        # Backpressure: block producer while all slots are in use:
+        if not self._slots.acquire(blocking=block, timeout=timeout):
+            return False
+        with self._pending_condition:
+            self._pending_items += 1
+        self._queue.put(item)
+        return True
+
+    def wait_for_capacity(self, timeout: float = None) -> bool:
+        # Producers wait until pending items are under the low watermark to avoid prefetching stale data:
+        with self._pending_condition:
+            return self._pending_condition.wait_for(lambda: self._pending_items <= self._low_watermark,
+                                                    timeout=timeout)
+
+    def join(self) -> None:
+        with self._pending_condition:
+            self._pending_condition.wait_for(lambda: self._pending_items == 0)
+
+    def stop(self) -> None:
+        with self._workers_lock:
+            self._stop = True
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.join()